@@ -2,9 +2,9 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from pathlib import Path
 import time
-from config import settings
 from utils.ai_models import GenderAgeDetector, BodyTypeDetector
 from database.users import user_db
+from database.photos import photo_registry
 
 router = APIRouter()
 gender_age_detector = GenderAgeDetector()
@@ -19,12 +19,12 @@ class AnalysisResponse(BaseModel):
 async def analyze_user(photo_id: str):
     start_time = time.time()
     
-    photo_files = list(settings.UPLOADS_DIR.glob(f"{photo_id}.*"))
+    photo = photo_registry.get(photo_id)
     
-    if not photo_files:
+    if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    photo_path = photo_files[0]
+    photo_path = photo['path']
     
     gender_age_result = gender_age_detector.detect(photo_path)
     
@@ -1,14 +1,20 @@
-from fastapi import APIRouter, HTTPException, Query
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+import json
 from typing import List, Optional, Dict  # Added Dict here
 from config import settings
 from utils.recommendation import RecommendationEngine
+from utils.preferences import preference_weights
 from utils.ai_services import openai_service, huggingface_service, free_style_analyzer
 from database.products import product_db
 from database.users import user_db
+from database.similarity import similarity_index
+from database.factors import factor_store
+from database.cursors import decode_cursor, encode_cursor
 
 router = APIRouter()
-recommendation_engine = RecommendationEngine()
+recommendation_engine = RecommendationEngine(factors=factor_store)
 
 class InteractionRequest(BaseModel):
     photo_id: str
@@ -16,26 +22,85 @@ class InteractionRequest(BaseModel):
     action: str
     duration_seconds: Optional[int] = 0
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
 @router.get("/products")
 async def get_all_products(
+    request: Request,
     gender: Optional[str] = None,
     style: Optional[str] = None,
-    limit: Optional[int] = None
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    products = product_db.get_all_products()
+    catalog = product_db.snapshot
+    
+    # A page is fully determined by the URL and the catalog version
+    etag = f'"catalog-v{catalog.version}"'
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    try:
+        products, total, next_cursor = product_db.page_products(
+            {'gender': gender, 'style': style},
+            limit,
+            cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if fields:
+        selected = ['product_id'] + [f.strip() for f in fields.split(",") if f.strip()]
+        products = [
+            {field: product[field] for field in selected if field in product}
+            for product in products
+        ]
     
-    if gender:
-        products = [p for p in products if p.get('gender') == gender]
+    return JSONResponse(
+        content={
+            "total": total,
+            "count": len(products),
+            "products": products,
+            "next_cursor": next_cursor
+        },
+        headers={"ETag": etag}
+    )
+
+@router.post("/products/import")
+async def import_products(
+    file: UploadFile = File(...),
+    batch_size: int = Query(settings.PRODUCT_IMPORT_BATCH_SIZE, ge=1)
+):
+    """Bulk-load an NDJSON product feed; streams one progress line per batch"""
     
-    if style:
-        products = [p for p in products if p.get('style') == style]
+    def progress():
+        for stats in product_db.import_products(file.file, batch_size):
+            yield json.dumps(stats) + "\n"
     
-    if limit:
-        products = products[:limit]
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
+@router.get("/products/search")
+async def search_products(
+    query: str = Query(..., min_length=1),
+    limit: int = Query(settings.SEARCH_PAGE_SIZE, ge=1, le=settings.SEARCH_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    try:
+        results, total, next_cursor = product_db.search(query, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
-        "total": len(products),
-        "products": products
+        "query": query,
+        "total": total,
+        "results": results,
+        "next_cursor": next_cursor
     }
 
 @router.get("/products/{product_id}")
@@ -72,20 +137,10 @@ async def get_product(product_id: str, enhance: bool = False):
     
     return product
 
-@router.get("/products/search")
-async def search_products(query: str = Query(..., min_length=1)):
-    results = product_db.search_products(query)
-    
-    return {
-        "query": query,
-        "total": len(results),
-        "results": results
-    }
-
 @router.get("/smart-suggestions")
 async def get_smart_suggestions(
     photo_id: str,
-    limit: Optional[int] = settings.TOP_SUGGESTIONS_COUNT
+    limit: Optional[int] = Query(settings.TOP_SUGGESTIONS_COUNT, ge=1)
 ):
     user_id = f"user_{photo_id}"
     user_profile = user_db.get_user_profile(user_id)
@@ -93,11 +148,11 @@ async def get_smart_suggestions(
     if not user_profile:
         raise HTTPException(status_code=404, detail="User profile not found. Please analyze photo first.")
     
-    all_products = product_db.get_all_products()
+    detected_profile = user_profile.get('detected_profile', {})
     
-    suggestions = recommendation_engine.get_personalized_suggestions(
-        all_products,
-        user_profile.get('detected_profile', {}),
+    suggestions = recommendation_engine.recommend(
+        product_db.snapshot,
+        detected_profile,
         limit
     )
     
@@ -115,7 +170,7 @@ async def get_smart_suggestions(
 @router.get("/recommended-for-you")
 async def get_personalized_recommendations(
     photo_id: str,
-    limit: Optional[int] = 20
+    limit: Optional[int] = Query(20, ge=1)
 ):
     user_id = f"user_{photo_id}"
     user_profile = user_db.get_user_profile(user_id)
@@ -123,37 +178,58 @@ async def get_personalized_recommendations(
     if not user_profile:
         raise HTTPException(status_code=404, detail="User profile not found")
     
-    all_products = product_db.get_all_products()
-    
     combined_profile = {
         **user_profile.get('detected_profile', {}),
+        'user_id': user_id,
         'preferences': user_profile.get('preferences', {})
     }
     
-    recommendations = recommendation_engine.get_personalized_suggestions(
-        all_products,
+    recommendations = recommendation_engine.recommend(
+        product_db.snapshot,
         combined_profile,
         limit
     )
+    preferences = preference_weights(user_profile.get('preferences'))
     
     return {
         "user_id": user_id,
         "based_on": {
-            "total_interactions": len(user_profile.get('interaction_history', [])),
-            "style_preferences": user_profile.get('preferences', {}).get('styles', {}),
-            "color_preferences": user_profile.get('preferences', {}).get('colors', {})
+            "total_interactions": user_profile.get('interaction_count', 0),
+            "style_preferences": preferences['styles'],
+            "color_preferences": preferences['colors']
         },
         "recommendations": recommendations
     }
 
+class BatchRecommendationRequest(BaseModel):
+    photo_ids: List[str]
+    limit: Optional[int] = Field(20, ge=1)
+
+@router.post("/recommended-for-you/batch")
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """
+    Recommendations for many users at once, as NDJSON: one
+    {"photo_id", "user_id", "recommendations"} line per requested id, in
+    request order, or an "error" line when the profile does not exist.
+    """
+    catalog = product_db.snapshot
+    
+    def profiles():
+        for photo_id in request.photo_ids:
+            user_id = f"user_{photo_id}"
+            yield user_id, user_db.get_user_profile(user_id, cache=False)
+    
+    def lines():
+        results = recommendation_engine.iter_batch(catalog, profiles(), request.limit)
+        for photo_id, result in zip(request.photo_ids, results):
+            yield json.dumps({"photo_id": photo_id, **result}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.post("/track-interaction")
 async def track_interaction(interaction: InteractionRequest):
     user_id = f"user_{interaction.photo_id}"
     
-    user_profile = user_db.get_user_profile(user_id)
-    if not user_profile:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     product = product_db.get_product_by_id(interaction.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -166,35 +242,48 @@ async def track_interaction(interaction: InteractionRequest):
         'duration_seconds': interaction.duration_seconds
     }
     
-    user_db.add_interaction(user_id, interaction_data)
-    
-    updated_profile = recommendation_engine.update_user_preferences(
-        user_profile,
-        interaction_data
+    # Log the interaction and fold it into the preferences in one write
+    updated_profile = user_db.add_interaction(
+        user_id,
+        interaction_data,
+        mutator=lambda profile: recommendation_engine.update_user_preferences(profile, interaction_data)
     )
     
-    user_db.update_preferences(user_id, updated_profile['preferences'])
+    if not updated_profile:
+        raise HTTPException(status_code=404, detail="User not found")
     
     return {
         "status": "success",
         "message": "Interaction tracked successfully",
-        "updated_preferences": updated_profile['preferences']
+        "updated_preferences": preference_weights(updated_profile['preferences'])
     }
 
 @router.get("/similar-products/{product_id}")
 async def get_similar_products(product_id: str, limit: int = 5):
-    product = product_db.get_product_by_id(product_id)
+    catalog = product_db.snapshot
+    product = catalog.get_product_by_id(product_id)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    all_products = product_db.get_all_products()
-    
-    similar = recommendation_engine.get_similar_products(
-        product,
-        all_products,
-        limit
-    )
+    similar = None
+    neighbors = similarity_index.neighbors(product_id, limit)
+    
+    if neighbors is not None:
+        products = catalog.get_products_by_ids([neighbor_id for neighbor_id, _ in neighbors])
+        if len(products) == len(neighbors):
+            similar = [
+                {**neighbor, 'similarity_score': score}
+                for neighbor, (_, score) in zip(products, neighbors)
+            ]
+    
+    if similar is None:
+        # Not indexed yet (new product, stale index, or limit above SIMILARITY_TOP_K)
+        similar = recommendation_engine.get_similar_products(
+            product,
+            catalog.products,
+            limit
+        )
     
     return {
         "product_id": product_id,
@@ -226,11 +315,94 @@ async def save_favorite(request: SaveFavoriteRequest):
         "message": "Favorite saved successfully"
     }
 
+def _stream_log(
+    user_id: str,
+    log: str,
+    cursor: Optional[str],
+    limit: Optional[int],
+    since: Optional[str],
+    until: Optional[str],
+    enrich=None
+) -> StreamingResponse:
+    """
+    NDJSON page of a user's cold log: one record per line, then a final
+    {"count", "next_cursor"} line. Records are read lazily from storage.
+    """
+    if not user_db.get_user_profile(user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not isinstance(after, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    records = user_db.iter_log(user_id, log, after, since, until)
+    
+    def lines():
+        count = 0
+        last_key = None
+        next_cursor = None
+        
+        for key, record in records:
+            if limit and count == limit:
+                next_cursor = encode_cursor(last_key)
+                break
+            
+            yield json.dumps(enrich(record) if enrich else record) + "\n"
+            count += 1
+            last_key = key
+        
+        yield json.dumps({"count": count, "next_cursor": next_cursor}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/favorites/{photo_id}/stream")
+async def stream_favorites(
+    photo_id: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Saved favorites as NDJSON, oldest first; since/until filter saved_at (ISO, [since, until))"""
+    catalog = product_db.snapshot
+    
+    def enrich(favorite: Dict) -> Dict:
+        return {**favorite, 'product': catalog.get_product_by_id(favorite.get('product_id'))}
+    
+    return _stream_log(f"user_{photo_id}", 'favorites', cursor, limit, since, until, enrich)
+
+@router.get("/history/{photo_id}/stream")
+async def stream_history(
+    photo_id: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    """Interaction history as NDJSON, oldest first; since/until filter timestamp (ISO, [since, until))"""
+    return _stream_log(f"user_{photo_id}", 'history', cursor, limit, since, until)
+
 @router.get("/favorites/{photo_id}")
 async def get_favorites(photo_id: str):
     user_id = f"user_{photo_id}"
     favorites = user_db.get_user_favorites(user_id)
     
+    products = {
+        product['product_id']: product
+        for product in product_db.get_products_by_ids(
+            [favorite.get('product_id') for favorite in favorites]
+        )
+    }
+    favorites = [
+        {**favorite, 'product': products.get(favorite.get('product_id'))}
+        for favorite in favorites
+    ]
+    
     return {
         "user_id": user_id,
         "total_favorites": len(favorites),
@@ -3,11 +3,13 @@ from pydantic import BaseModel
 from pathlib import Path
 import time
 import uuid
-from typing import List
+from typing import Dict, List
 from config import settings
 from utils.virtual_tryon import VirtualTryOn
 from database.products import product_db
 from database.users import user_db
+from database.photos import photo_registry
+from utils.sharding import sharded_path, sharded_url, find_sharded
 
 router = APIRouter()
 virtual_tryon = VirtualTryOn()
@@ -23,19 +25,15 @@ class TryOnResponse(BaseModel):
     processing_time: float
     quality_score: float
 
-@router.post("/try-on", response_model=TryOnResponse)
-async def try_on(request: TryOnRequest):
-    start_time = time.time()
-    
-    photo_files = list(settings.UPLOADS_DIR.glob(f"{request.photo_id}.*"))
-    if not photo_files:
+def _resolve_user_photo(photo_id: str) -> Path:
+    photo = photo_registry.get(photo_id)
+    if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    user_photo_path = photo_files[0]
-    
-    product = product_db.get_product_by_id(request.product_id)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    return photo['path']
+
+def _run_tryon(photo_id: str, user_photo_path: Path, product: Dict) -> Dict:
+    start_time = time.time()
     
     product_image_path = settings.BASE_DIR / product['image_path']
     if not product_image_path.exists():
@@ -43,7 +41,7 @@ async def try_on(request: TryOnRequest):
     
     tryon_id = f"tryon_{uuid.uuid4().hex[:12]}"
     output_filename = f"{tryon_id}.jpg"
-    output_path = settings.OUTPUTS_DIR / output_filename
+    output_path = sharded_path(settings.OUTPUTS_DIR, output_filename, create=True)
     
     result = virtual_tryon.process_tryon(
         user_photo_path,
@@ -57,10 +55,10 @@ async def try_on(request: TryOnRequest):
             detail=f"Try-on processing failed: {result.get('error', 'Unknown error')}"
         )
     
-    user_id = f"user_{request.photo_id}"
+    user_id = f"user_{photo_id}"
     interaction = {
         'action': 'tried_on',
-        'product_id': request.product_id,
+        'product_id': product['product_id'],
         'product_style': product.get('style'),
         'product_colors': product.get('colors', []),
         'tryon_id': tryon_id
@@ -72,11 +70,21 @@ async def try_on(request: TryOnRequest):
     return {
         "tryon_id": tryon_id,
         "status": "success",
-        "image_url": f"/outputs/{output_filename}",
+        "image_url": sharded_url("outputs", output_filename),
         "processing_time": round(processing_time, 2),
         "quality_score": result.get('quality_score', 0.8)
     }
 
+@router.post("/try-on", response_model=TryOnResponse)
+async def try_on(request: TryOnRequest):
+    user_photo_path = _resolve_user_photo(request.photo_id)
+    
+    product = product_db.get_product_by_id(request.product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    return _run_tryon(request.photo_id, user_photo_path, product)
+
 class MultipleTryOnRequest(BaseModel):
     photo_id: str
     product_ids: List[str]
@@ -85,13 +93,19 @@ class MultipleTryOnRequest(BaseModel):
 async def try_on_multiple(request: MultipleTryOnRequest):
     results = []
     
+    user_photo_path = _resolve_user_photo(request.photo_id)
+    products = {
+        product['product_id']: product
+        for product in product_db.get_products_by_ids(request.product_ids)
+    }
+    
     for product_id in request.product_ids:
         try:
-            single_request = TryOnRequest(
-                photo_id=request.photo_id,
-                product_id=product_id
-            )
-            result = await try_on(single_request)
+            product = products.get(product_id)
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
+            
+            result = _run_tryon(request.photo_id, user_photo_path, product)
             results.append(result)
         except Exception as e:
             results.append({
@@ -108,15 +122,13 @@ async def try_on_multiple(request: MultipleTryOnRequest):
 
 @router.get("/tryon/{tryon_id}")
 async def get_tryon_result(tryon_id: str):
-    output_files = list(settings.OUTPUTS_DIR.glob(f"{tryon_id}.*"))
+    output_file = find_sharded(settings.OUTPUTS_DIR, tryon_id)
     
-    if not output_files:
+    if not output_file:
         raise HTTPException(status_code=404, detail="Try-on result not found")
     
-    output_file = output_files[0]
-    
     return {
         "tryon_id": tryon_id,
-        "image_url": f"/outputs/{output_file.name}",
+        "image_url": sharded_url("outputs", output_file.name),
         "exists": True
     }
\ No newline at end of file
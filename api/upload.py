@@ -1,9 +1,11 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pathlib import Path
 import uuid
-import shutil
+import hashlib
 from config import settings
 from utils.image_processing import ImageProcessor
+from utils.sharding import sharded_path, sharded_url
+from database.photos import photo_registry
 
 router = APIRouter()
 image_processor = ImageProcessor()
@@ -22,10 +24,14 @@ async def upload_photo(file: UploadFile = File(...)):
     
     photo_id = f"photo_{uuid.uuid4().hex[:12]}"
     photo_filename = f"{photo_id}{file_extension}"
-    photo_path = settings.UPLOADS_DIR / photo_filename
+    photo_path = sharded_path(settings.UPLOADS_DIR, photo_filename, create=True)
     
+    # Hash while copying so the registry gets it without a second read
+    sha256 = hashlib.sha256()
     with open(photo_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+        for chunk in iter(lambda: file.file.read(1024 * 1024), b''):
+            sha256.update(chunk)
+            buffer.write(chunk)
     
     is_valid, message = image_processor.validate_image(photo_path)
     if not is_valid:
@@ -33,11 +39,12 @@ async def upload_photo(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail=message)
     
     quality_info = image_processor.get_image_quality_score(photo_path)
+    photo_registry.register(photo_id, photo_path, sha256.hexdigest(), quality_info)
     
     return {
         "photo_id": photo_id,
         "filename": photo_filename,
-        "path": f"/uploads/{photo_filename}",
+        "path": sharded_url("uploads", photo_filename),
         "status": "success",
         "quality": quality_info,
         "message": "Photo uploaded successfully"
@@ -45,13 +52,13 @@ async def upload_photo(file: UploadFile = File(...)):
 
 @router.delete("/photo/{photo_id}")
 async def delete_photo(photo_id: str):
-    photo_files = list(settings.UPLOADS_DIR.glob(f"{photo_id}.*"))
+    photo = photo_registry.get(photo_id)
     
-    if not photo_files:
+    if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    for photo_file in photo_files:
-        photo_file.unlink()
+    photo['path'].unlink()
+    photo_registry.remove(photo_id)
     
     return {
         "status": "success",
@@ -61,18 +68,24 @@ async def delete_photo(photo_id: str):
 
 @router.get("/photo/{photo_id}")
 async def get_photo_info(photo_id: str):
-    photo_files = list(settings.UPLOADS_DIR.glob(f"{photo_id}.*"))
+    photo = photo_registry.get(photo_id)
     
-    if not photo_files:
+    if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
-    photo_path = photo_files[0]
-    quality_info = image_processor.get_image_quality_score(photo_path)
+    quality_info = photo['quality']
+    if quality_info is None:
+        # Registered from disk rather than at upload; score it once
+        quality_info = image_processor.get_image_quality_score(photo['path'])
+        photo_registry.set_quality(photo_id, quality_info)
     
     return {
         "photo_id": photo_id,
-        "filename": photo_path.name,
-        "path": f"/uploads/{photo_path.name}",
+        "filename": photo['filename'],
+        "path": sharded_url("uploads", photo['filename']),
         "quality": quality_info,
+        "width": photo['width'],
+        "height": photo['height'],
+        "sha256": photo['sha256'],
         "exists": True
     }
\ No newline at end of file
@@ -0,0 +1,24 @@
+"""
+Build Similarity Index - Precomputes the top-K similar products per product
+The API keeps the index current in the background; run this to build it
+offline (e.g. after a bulk import) so workers start with it memory-mapped
+"""
+
+import time
+from config import settings
+from database.products import product_db
+from database.similarity import similarity_index
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("🔗 SmartFit AI - Similar Products Index")
+    print("=" * 60)
+    print()
+    
+    start_time = time.time()
+    similarity_index.rebuild()
+    
+    print(f"✅ Indexed {len(product_db.snapshot):,} products (top {settings.SIMILARITY_TOP_K} each)")
+    print(f"   Catalog version: {similarity_index.version}")
+    print(f"   Saved to: {settings.SIMILARITY_INDEX_DIR}")
+    print(f"\n🎉 Done in {time.time() - start_time:.1f}s!")
@@ -30,6 +30,11 @@ class Settings:
     MODELS_DIR.mkdir(exist_ok=True)
     USER_DATA_DIR.mkdir(exist_ok=True)
     
+    # Hex prefix levels for uploads/, outputs/ and user_data/ (0 = flat).
+    # Files are only looked up at this depth: run migrate_storage_layout.py
+    # with the new value before changing it on an existing tree.
+    STORAGE_SHARD_DEPTH = int(os.getenv("STORAGE_SHARD_DEPTH", "0"))
+    
     # API Keys
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
@@ -58,12 +63,64 @@ class Settings:
     AGE_GROUPS = ["kids", "teens", "young_adults", "adults"]
     STYLE_CATEGORIES = ["casual", "formal", "ethnic", "sporty", "party"]
     BODY_TYPES = ["slim", "athletic", "average", "plus_size"]
+    COLOR_VOCABULARY = [
+        "black", "white", "gray", "navy", "blue", "red", "pink", "green",
+        "yellow", "orange", "purple", "brown", "beige", "maroon", "olive",
+        "cream", "gold", "silver", "multicolor"
+    ]
     
     # Recommendation Settings
     TOP_SUGGESTIONS_COUNT = 50
     STYLE_WEIGHT = 2.0
     COLOR_WEIGHT = 1.0
     BODY_TYPE_WEIGHT = 1.5
+    PREFERENCE_HALF_LIFE_DAYS = float(os.getenv("PREFERENCE_HALF_LIFE_DAYS", "30"))
+    RECOMMENDATION_CACHE_SEGMENTS = int(os.getenv("RECOMMENDATION_CACHE_SEGMENTS", "64"))
+    RECOMMENDATION_CACHE_HEAD = int(os.getenv("RECOMMENDATION_CACHE_HEAD", "500"))
+    BATCH_SCORE_CELLS = int(os.getenv("BATCH_SCORE_CELLS", str(4 * 1024 * 1024)))
+    BATCH_USERS_PER_CHUNK = int(os.getenv("BATCH_USERS_PER_CHUNK", "5000"))
+    
+    # Similar-products index (precomputed top-K neighbors per product)
+    SIMILARITY_INDEX_DIR = BASE_DIR / "similarity_index"
+    SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "20"))
+    SIMILARITY_REFRESH_INTERVAL = float(os.getenv("SIMILARITY_REFRESH_INTERVAL", "5"))
+    
+    # Collaborative filtering (implicit ALS factors rebuilt offline by train_factors.py)
+    CF_FACTORS_DIR = BASE_DIR / "cf_factors"
+    CF_FACTORS = int(os.getenv("CF_FACTORS", "32"))
+    CF_ITERATIONS = int(os.getenv("CF_ITERATIONS", "15"))
+    CF_REGULARIZATION = float(os.getenv("CF_REGULARIZATION", "0.1"))
+    CF_ALPHA = float(os.getenv("CF_ALPHA", "40"))
+    CF_BLEND_WEIGHT = float(os.getenv("CF_BLEND_WEIGHT", "10"))
+    CF_CANDIDATES = int(os.getenv("CF_CANDIDATES", "200"))
+    CF_REFRESH_INTERVAL = float(os.getenv("CF_REFRESH_INTERVAL", "60"))
+    
+    # Catalog Persistence ("json" snapshot + journal, or "sqlite" at DATABASE_URL)
+    PRODUCT_STORAGE = os.getenv("PRODUCT_STORAGE", "json").lower()
+    PRODUCT_JOURNAL_COMPACT_EVERY = int(os.getenv("PRODUCT_JOURNAL_COMPACT_EVERY", "1000"))
+    PRODUCT_JOURNAL_FSYNC = os.getenv("PRODUCT_JOURNAL_FSYNC", "False").lower() == "true"
+    CATALOG_RELOAD_INTERVAL = float(os.getenv("CATALOG_RELOAD_INTERVAL", "2"))
+    PRODUCT_IMPORT_BATCH_SIZE = int(os.getenv("PRODUCT_IMPORT_BATCH_SIZE", "10000"))
+    
+    # User Profile Storage ("json" files in USER_DATA_DIR, or "sqlite" at DATABASE_URL)
+    USER_STORAGE = os.getenv("USER_STORAGE", "json").lower()
+    # Encoding of stored profiles and logs ("json" or framed "msgpack"); both are always readable
+    USER_PROFILE_FORMAT = os.getenv("USER_PROFILE_FORMAT", "json").lower()
+    USER_HISTORY_COMPRESS = os.getenv("USER_HISTORY_COMPRESS", "False").lower() == "true"
+    
+    # User Profile Cache: "write_through" persists every update and keeps
+    # workers coherent; "write_back" caches and flushes every
+    # USER_FLUSH_INTERVAL seconds, and is only safe with a single worker
+    # process (each worker's flush would overwrite the others' updates)
+    USER_WRITE_MODE = os.getenv("USER_WRITE_MODE", "write_through").lower()
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "5"))
+    USER_HISTORY_RETENTION = int(os.getenv("USER_HISTORY_RETENTION", "5000"))
+    USER_HISTORY_COMPACT_BYTES = int(os.getenv("USER_HISTORY_COMPACT_BYTES", str(1024 * 1024)))
+    
+    # Search Settings
+    SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+    SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "100"))
     
     # Server Settings
     HOST = os.getenv("HOST", "0.0.0.0")
@@ -0,0 +1,276 @@
+import heapq
+import threading
+from bisect import bisect_right
+from typing import List, Dict, Optional, Set, Tuple
+from database.chunked import ChunkedDict, ChunkedList
+from database.columns import CatalogColumns
+from database.cursors import decode_cursor, encode_cursor
+from database.indexes import AttributeIndex, SearchIndex
+
+class CatalogSnapshot:
+    """
+    Immutable, versioned view of the product catalog and its indexes.
+
+    Request handlers grab one snapshot and read from it without locks.
+    Writers never touch a published snapshot: apply() derives a new one
+    that shares every untouched chunk and posting with its parent, so a
+    write costs O(change), and the owner swaps the reference atomically.
+    Product dicts are treated as frozen once published - updates replace
+    them instead of mutating in place.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        rows: ChunkedList,
+        sequence: ChunkedDict,
+        attribute_index: AttributeIndex,
+        search_index: SearchIndex,
+        columns_base: Optional[Tuple[CatalogColumns, Set[int]]] = None
+    ):
+        self.version = version
+        # Sequence number -> product (None once deleted), and its inverse
+        self._rows = rows
+        self._sequence = sequence
+        self.attribute_index = attribute_index
+        self.search_index = search_index
+        self._products: Optional[List[Dict]] = None
+        self._sequence_list: Optional[List[int]] = None
+        self._columns: Optional[CatalogColumns] = None
+        # An ancestor's columns and the rows changed since, to derive ours from
+        self._columns_base = columns_base
+        self._columns_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, products: List[Dict], version: int) -> 'CatalogSnapshot':
+        attribute_index = AttributeIndex()
+        search_index = SearchIndex()
+        rows = ChunkedList()
+        sequence = ChunkedDict()
+
+        for product in products:
+            product_id = product['product_id']
+            if product_id in sequence:
+                continue
+
+            sequence[product_id] = len(rows)
+            attribute_index.add(product, len(rows))
+            search_index.add(product, len(rows))
+            rows.append(product)
+
+        return cls(version, rows, sequence, attribute_index, search_index)
+
+    def apply(self, entries: List[Dict], version: int) -> 'CatalogSnapshot':
+        """Derive the snapshot that results from applying journal entries"""
+        rows = self._rows.copy()
+        sequence = self._sequence.copy()
+        attribute_index = self.attribute_index.copy()
+        search_index = self.search_index.copy()
+        # Updated or deleted rows; appended ones are implied by the length
+        changed: Set[int] = set()
+
+        for entry in entries:
+            op = entry.get('op')
+
+            if op == 'add':
+                product = entry['product']
+                product_id = product['product_id']
+                if product_id in sequence:
+                    continue
+
+                sequence[product_id] = len(rows)
+                attribute_index.add(product, len(rows))
+                search_index.add(product, len(rows))
+                rows.append(product)
+
+            elif op == 'update':
+                product_id = entry['product_id']
+                seq = sequence.get(product_id)
+                if seq is None:
+                    continue
+
+                old_product = rows[seq]
+                product = {**old_product, **entry['updates']}
+                attribute_index.remove(old_product, seq)
+                search_index.remove(old_product, seq)
+
+                new_id = product['product_id']
+                if new_id != product_id:
+                    # Keep the sequence number so catalog order survives an id change
+                    sequence.pop(product_id)
+                    sequence[new_id] = seq
+
+                rows[seq] = product
+                changed.add(seq)
+                attribute_index.add(product, seq)
+                search_index.add(product, seq)
+
+            elif op == 'delete':
+                seq = sequence.pop(entry['product_id'])
+                if seq is None:
+                    continue
+
+                product = rows[seq]
+                rows[seq] = None
+                changed.add(seq)
+                attribute_index.remove(product, seq)
+                search_index.remove(product, seq)
+
+        # Read the pending base first: a concurrent build sets _columns before clearing it
+        pending, built = self._columns_base, self._columns
+        if built is not None:
+            columns_base = (built, changed)
+        elif pending is not None and len(pending[1]) + len(changed) <= len(rows) // 4:
+            columns_base = (pending[0], pending[1] | changed)
+        else:
+            # Nothing to derive from, or so much changed that a fresh build is as cheap
+            columns_base = None
+
+        return CatalogSnapshot(version, rows, sequence, attribute_index, search_index, columns_base)
+
+    def __len__(self) -> int:
+        return len(self._sequence)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._sequence
+
+    @property
+    def products(self) -> List[Dict]:
+        if self._products is None:
+            self._products = [product for product in self._rows if product is not None]
+        return self._products
+
+    @property
+    def columns(self) -> CatalogColumns:
+        """
+        Array-backed view for vectorized scoring, indexed by sequence
+        slot. Derived from an ancestor's columns when one was built,
+        re-encoding only changed rows, so it stays cheap after a write.
+        """
+        if self._columns is None:
+            with self._columns_lock:
+                if self._columns is None:
+                    if self._columns_base is None:
+                        self._columns = CatalogColumns(self._rows, self.version)
+                    else:
+                        base, changed = self._columns_base
+                        self._columns = base.updated(self._rows, changed, self.version)
+                    self._columns_base = None
+        return self._columns
+
+    def get_product_by_id(self, product_id: str) -> Optional[Dict]:
+        seq = self._sequence.get(product_id)
+        return None if seq is None else self._rows[seq]
+
+    def get_products_by_ids(self, product_ids: List[str]) -> List[Dict]:
+        """Bulk lookup in request order; unknown ids are skipped"""
+        products = []
+
+        for product_id in product_ids:
+            seq = self._sequence.get(product_id)
+            if seq is not None:
+                products.append(self._rows[seq])
+
+        return products
+
+    def query_products(
+        self,
+        gender: Optional[str] = None,
+        age_group: Optional[str] = None,
+        style: Optional[str] = None,
+        category: Optional[str] = None,
+        color: Optional[str] = None,
+        body_type: Optional[str] = None
+    ) -> List[Dict]:
+        """Filter the catalog through the attribute index, in catalog order"""
+        seqs = self.attribute_index.lookup({
+            'gender': gender,
+            'age_group': age_group,
+            'style': style,
+            'category': category,
+            'color': color,
+            'body_type': body_type
+        })
+
+        if seqs is None:
+            return list(self.products)
+
+        return self._rows.lookup(sorted(seqs))
+
+    def page_products(
+        self,
+        filters: Dict[str, Optional[str]],
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], int, Optional[str]]:
+        """
+        Keyset pagination in catalog order. The cursor holds the sequence
+        number of the last product served, so pages stay stable while
+        the catalog changes underneath.
+        Returns (page, total matches, cursor for the next page).
+        """
+        after = -1
+        if cursor:
+            after = decode_cursor(cursor)
+            if not isinstance(after, int):
+                raise ValueError("Invalid cursor")
+
+        seqs = self.attribute_index.lookup(filters)
+
+        if seqs is None:
+            total = len(self)
+            if self._sequence_list is None:
+                self._sequence_list = [seq for seq, product in enumerate(self._rows) if product is not None]
+            start = bisect_right(self._sequence_list, after)
+            end = start + limit if limit else None
+            page = self.products[start:end]
+            remaining = total - start
+        else:
+            total = len(seqs)
+            keys = [seq for seq in seqs if seq > after]
+            remaining = len(keys)
+            page = self._rows.lookup(heapq.nsmallest(limit, keys) if limit else sorted(keys))
+
+        next_cursor = None
+        if limit and remaining > limit and page:
+            next_cursor = encode_cursor(self._sequence[page[-1]['product_id']])
+
+        return page, total, next_cursor
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], int, Optional[str]]:
+        """
+        Ranked search over the token index.
+        Returns (page of results, total matches, cursor for the next page).
+        """
+        scores = self.search_index.search(query)
+
+        keys = [(-score, seq) for seq, score in scores.items()]
+
+        if cursor:
+            try:
+                neg_score, sequence = decode_cursor(cursor)
+                after = (float(neg_score), int(sequence))
+            except (TypeError, ValueError):
+                raise ValueError("Invalid cursor")
+            keys = [key for key in keys if key > after]
+
+        if limit:
+            page = heapq.nsmallest(limit, keys)
+        else:
+            page = sorted(keys)
+
+        results = [
+            {**self._rows[seq], 'relevance_score': -neg_score}
+            for neg_score, seq in page
+        ]
+
+        next_cursor = None
+        if limit and len(page) == limit and len(keys) > limit:
+            next_cursor = encode_cursor(page[-1])
+
+        return results, len(scores), next_cursor
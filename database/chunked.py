@@ -0,0 +1,178 @@
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+# Hash buckets per ChunkedDict / ChunkedSet
+BUCKETS = 256
+
+# Slots per ChunkedList chunk
+CHUNK_SIZE = 1024
+
+class _Chunked:
+    """
+    Shared machinery of the chunked containers: contents are split into
+    buckets, copy() shares all of them with the source and a bucket is
+    copied the first time the copy writes to it. A write therefore costs
+    O(bucket), not O(container), and a published container is never
+    modified as long as writers only ever touch copies.
+    """
+
+    _empty: Any = None
+
+    def __init__(self):
+        self._buckets: List = []
+        self._size = 0
+        # Bucket numbers this instance may mutate; None means all of them
+        self._owned: Optional[Set[int]] = None
+
+    def copy(self):
+        clone = self.__class__.__new__(self.__class__)
+        clone._buckets = list(self._buckets)
+        clone._size = self._size
+        clone._owned = set()
+        return clone
+
+    def _writable(self, i: int):
+        bucket = self._buckets[i]
+
+        if bucket is self._empty or (self._owned is not None and i not in self._owned):
+            bucket = self._buckets[i] = self._new_bucket(bucket)
+            if self._owned is not None:
+                self._owned.add(i)
+
+        return bucket
+
+    def _new_bucket(self, bucket):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator:
+        return chain.from_iterable(self._buckets)
+
+class ChunkedDict(_Chunked):
+    """Unordered dict with O(bucket) copy-on-write; see _Chunked"""
+
+    _empty: Dict = {}
+
+    def __init__(self):
+        super().__init__()
+        self._buckets = [self._empty] * BUCKETS
+
+    def _new_bucket(self, bucket: Dict) -> Dict:
+        return dict(bucket)
+
+    def _bucket(self, key) -> Dict:
+        return self._buckets[hash(key) % BUCKETS]
+
+    def __contains__(self, key) -> bool:
+        return key in self._bucket(key)
+
+    def __getitem__(self, key):
+        return self._bucket(key)[key]
+
+    def get(self, key, default=None):
+        return self._bucket(key).get(key, default)
+
+    def lookup(self, keys: Iterable) -> List:
+        """self[key] for every key, without a method call per key"""
+        buckets = self._buckets
+        return [buckets[hash(key) % BUCKETS][key] for key in keys]
+
+    def __setitem__(self, key, value):
+        i = hash(key) % BUCKETS
+        bucket = self._buckets[i]
+        if bucket is self._empty or self._owned is not None:
+            bucket = self._writable(i)
+
+        if key not in bucket:
+            self._size += 1
+        bucket[key] = value
+
+    def pop(self, key, default=None):
+        if key not in self._bucket(key):
+            return default
+
+        self._size -= 1
+        return self._writable(hash(key) % BUCKETS).pop(key)
+
+    def items(self) -> Iterator:
+        return chain.from_iterable(bucket.items() for bucket in self._buckets)
+
+    def values(self) -> Iterator:
+        return chain.from_iterable(bucket.values() for bucket in self._buckets)
+
+class ChunkedSet(_Chunked):
+    """Unordered set with O(bucket) copy-on-write; see _Chunked"""
+
+    _empty: frozenset = frozenset()
+
+    def __init__(self):
+        super().__init__()
+        self._buckets = [self._empty] * BUCKETS
+
+    def _new_bucket(self, bucket) -> Set:
+        return set(bucket)
+
+    def __contains__(self, item) -> bool:
+        return item in self._buckets[hash(item) % BUCKETS]
+
+    def add(self, item):
+        i = hash(item) % BUCKETS
+        bucket = self._buckets[i]
+        if item in bucket:
+            return
+
+        if bucket is self._empty or self._owned is not None:
+            bucket = self._writable(i)
+        self._size += 1
+        bucket.add(item)
+
+    def discard(self, item):
+        if item in self:
+            self._size -= 1
+            self._writable(hash(item) % BUCKETS).discard(item)
+
+def intersect(sets: List[ChunkedSet]) -> Set:
+    """
+    Intersection of ChunkedSets as a plain set. Equal items hash to the
+    same bucket number in every set, so buckets intersect pairwise.
+    """
+    sets = sorted(sets, key=len)
+    result: Set = set()
+
+    for buckets in zip(*(s._buckets for s in sets)):
+        if buckets[0]:
+            result.update(buckets[0].intersection(*buckets[1:]))
+
+    return result
+
+class ChunkedList(_Chunked):
+    """
+    List in fixed-size chunks with the same copy-on-write sharing as
+    ChunkedDict. Slots are appended or overwritten, never removed, so
+    indexes stay stable.
+    """
+
+    _empty: List = []
+
+    def _new_bucket(self, bucket: List) -> List:
+        return list(bucket)
+
+    def __getitem__(self, index: int):
+        return self._buckets[index // CHUNK_SIZE][index % CHUNK_SIZE]
+
+    def lookup(self, indexes: Iterable[int]) -> List:
+        """self[index] for every index, without a method call per index"""
+        chunks = self._buckets
+        return [chunks[index // CHUNK_SIZE][index % CHUNK_SIZE] for index in indexes]
+
+    def __setitem__(self, index: int, value):
+        self._writable(index // CHUNK_SIZE)[index % CHUNK_SIZE] = value
+
+    def append(self, value):
+        if self._size % CHUNK_SIZE == 0:
+            self._buckets.append(self._empty)
+
+        self._writable(len(self._buckets) - 1).append(value)
+        self._size += 1
@@ -0,0 +1,167 @@
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+def top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> np.ndarray:
+    """
+    Rows with the k highest scores, best first, in O(n + k log k). Ties
+    resolve to the earlier row, matching a stable sort.
+    """
+    return rows[select_top(scores[rows], rows, k)]
+
+def select_top(candidate_scores: np.ndarray, rows: np.ndarray, k: int) -> np.ndarray:
+    """
+    Like top_k, for scores aligned with rows (which need not be in row
+    order); returns positions into the candidate arrays. A k below 1
+    selects nothing.
+    """
+    if k < 1:
+        return np.empty(0, dtype=np.intp)
+
+    if k < len(rows):
+        kth = np.partition(candidate_scores, len(rows) - k)[len(rows) - k]
+        above = np.flatnonzero(candidate_scores > kth)
+        ties = np.flatnonzero(candidate_scores == kth)
+        ties = ties[np.argsort(rows[ties], kind='stable')][:k - len(above)]
+        selected = np.concatenate([above, ties])
+    else:
+        selected = np.arange(len(rows))
+
+    order = np.lexsort((rows[selected], -candidate_scores[selected]))
+    return selected[order]
+
+# Single-valued columns: name -> (product field, value when missing)
+CATEGORICAL_COLUMNS = {
+    'gender': ('gender', None),
+    # rank_products treats a missing style as casual
+    'style': ('style', 'casual'),
+    'category': ('category', None),
+}
+
+# Multi-valued columns stored as bitmasks: name -> product field
+SET_COLUMNS = {
+    'age': 'age_groups',
+    'color': 'colors',
+    'body_type': 'body_types_suited',
+}
+
+class CatalogColumns:
+    """
+    Column-oriented, array-backed view of one catalog snapshot.
+    Row i describes the product in sequence slot i of the snapshot
+    (products[i], None once deleted); single-valued fields are stored
+    as categorical codes and multi-valued ones as bitmasks, so a profile
+    can be filtered and scored with a few vectorized NumPy operations.
+    Deleted rows have code -1 and empty masks, so they match no filter.
+
+    updated() derives the columns of a later snapshot by re-encoding
+    only the rows that changed.
+    """
+
+    def __init__(self, products, version: int = 0):
+        self.products = products
+        self.size = len(products)
+        self.version = version
+
+        for name in CATEGORICAL_COLUMNS:
+            setattr(self, f"{name}_codes", np.full(self.size, -1, dtype=np.int32))
+            setattr(self, f"{name}_vocabulary", {})
+        for name in SET_COLUMNS:
+            setattr(self, f"{name}_masks", np.zeros((self.size, 1), dtype=np.uint64))
+            setattr(self, f"{name}_vocabulary", {})
+
+        self._encode_rows(np.arange(self.size), list(products))
+
+    def updated(self, products, changed: Iterable[int], version: int) -> 'CatalogColumns':
+        """
+        Columns for products, a later state of the same slots: rows in
+        changed and slots appended since are re-encoded, the rest are
+        copied. Vocabularies only ever grow, so existing codes stay valid.
+        """
+        columns = CatalogColumns.__new__(CatalogColumns)
+        columns.products = products
+        columns.size = len(products)
+        columns.version = version
+
+        for name in CATEGORICAL_COLUMNS:
+            codes = np.full(columns.size, -1, dtype=np.int32)
+            codes[:self.size] = getattr(self, f"{name}_codes")
+            setattr(columns, f"{name}_codes", codes)
+            setattr(columns, f"{name}_vocabulary", dict(getattr(self, f"{name}_vocabulary")))
+        for name in SET_COLUMNS:
+            old_masks = getattr(self, f"{name}_masks")
+            masks = np.zeros((columns.size, old_masks.shape[1]), dtype=np.uint64)
+            masks[:self.size] = old_masks
+            setattr(columns, f"{name}_masks", masks)
+            setattr(columns, f"{name}_vocabulary", dict(getattr(self, f"{name}_vocabulary")))
+
+        rows = np.union1d(
+            np.fromiter(changed, dtype=np.int64),
+            np.arange(self.size, columns.size)
+        )
+        rows = rows[rows < columns.size]
+        columns._encode_rows(rows, [products[row] for row in rows])
+        return columns
+
+    def _encode_rows(self, rows: np.ndarray, products: List[Optional[Dict]]):
+
+        for name, (field, default) in CATEGORICAL_COLUMNS.items():
+            vocabulary = getattr(self, f"{name}_vocabulary")
+            getattr(self, f"{name}_codes")[rows] = np.fromiter(
+                (
+                    -1 if product is None else vocabulary.setdefault(product.get(field, default), len(vocabulary))
+                    for product in products
+                ),
+                dtype=np.int32,
+                count=len(products)
+            )
+
+        for name, field in SET_COLUMNS.items():
+            vocabulary = getattr(self, f"{name}_vocabulary")
+            bits = [0] * len(products)
+            for i, product in enumerate(products):
+                if product is None:
+                    continue
+                mask = 0
+                for item in product.get(field, []):
+                    mask |= 1 << vocabulary.setdefault(item, len(vocabulary))
+                bits[i] = mask
+
+            masks = getattr(self, f"{name}_masks")
+            words = max(1, (len(vocabulary) + 63) // 64)
+            if words > masks.shape[1]:
+                masks = np.hstack([masks, np.zeros((self.size, words - masks.shape[1]), dtype=np.uint64)])
+                setattr(self, f"{name}_masks", masks)
+
+            for word in range(words):
+                shift = 64 * word
+                masks[rows, word] = np.fromiter(
+                    ((mask >> shift) & 0xFFFFFFFFFFFFFFFF for mask in bits),
+                    dtype=np.uint64,
+                    count=len(bits)
+                )
+
+    def equals(self, codes: np.ndarray, vocabulary: Dict[str, int], value: str) -> np.ndarray:
+        code = vocabulary.get(value)
+        if code is None:
+            return np.zeros(self.size, dtype=bool)
+        return codes == code
+
+    def contains(self, masks: np.ndarray, vocabulary: Dict[str, int], value: str) -> np.ndarray:
+        """Per-row membership test; masks may also be a subset of rows"""
+        bit = vocabulary.get(value)
+        if bit is None:
+            return np.zeros(len(masks), dtype=bool)
+        return (masks[:, bit // 64] & np.uint64(1 << (bit % 64))) != 0
+
+    def code_weights(self, vocabulary: Dict[str, int], weights: Dict[str, float]) -> np.ndarray:
+        """Lookup table code -> weight for gathering per-row scores"""
+        table = np.zeros(len(vocabulary) + 1, dtype=np.float64)
+        for value, weight in weights.items():
+            code = vocabulary.get(value)
+            if code is not None:
+                table[code] = weight
+        return table
+
+    def top_k(self, scores: np.ndarray, rows: np.ndarray, k: int) -> np.ndarray:
+        """Catalog rows with the k highest scores, best first"""
+        return top_k(scores, rows, k)
@@ -0,0 +1,12 @@
+import json
+import base64
+
+def encode_cursor(key) -> str:
+    """Opaque pagination cursor for a JSON-serializable keyset position"""
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
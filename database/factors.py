@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from config import settings
+from database.lazy import lazy_singletons
+
+class FactorStore:
+    """
+    User and item latent factors from the offline collaborative-filtering
+    job (train_factors.py), shared by every worker.
+
+    Each build is saved as .npy arrays in its own directory and published
+    by atomically switching index.json to it; workers memory-map the
+    arrays, so one copy lives in the page cache however many processes
+    serve from it. A background thread picks up new builds.
+    """
+
+    def __init__(self, factor_dir: Path):
+        self.factor_dir = factor_dir
+        self._state = None  # (directory, user_row, user_factors, item_row, item_factors)
+        self._item_rows = None  # (catalog version, state, catalog row -> item factor row)
+
+        self._load()
+
+        if settings.CF_REFRESH_INTERVAL > 0:
+            threading.Thread(target=self._watch, daemon=True).start()
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._state[0] if self._state else None
+
+    def user_vector(self, user_id: Optional[str]) -> Optional[np.ndarray]:
+        """The user's factor vector, or None for unknown users and before the first build"""
+        state = self._state
+        if state is None or user_id is None:
+            return None
+
+        row = state[1].get(user_id)
+        return None if row is None else state[2][row]
+
+    def item_scores(self, catalog, user_vector: np.ndarray) -> np.ndarray:
+        """Dot product with every catalog row's item factors; 0 for items without factors"""
+        state = self._state
+        item_rows = self.item_rows(catalog, state)
+
+        scores = np.zeros(len(state[4]) + 1, dtype=np.float32)
+        scores[:-1] = state[4] @ user_vector
+        # Row -1 (no factors) reads the trailing zero
+        return scores[item_rows]
+
+    def item_rows(self, catalog, state=None) -> np.ndarray:
+        """Column row -> item factor row (-1 if the product has none), cached per catalog version"""
+        state = state or self._state
+        cached = self._item_rows
+        if cached is not None and cached[0] == catalog.version and cached[1] is state:
+            return cached[2]
+
+        item_row = state[3]
+        columns = catalog.columns
+        item_rows = np.fromiter(
+            (-1 if product is None else item_row.get(product['product_id'], -1) for product in columns.products),
+            dtype=np.int64,
+            count=columns.size
+        )
+        self._item_rows = (catalog.version, state, item_rows)
+        return item_rows
+
+    def _watch(self):
+        while True:
+            time.sleep(settings.CF_REFRESH_INTERVAL)
+            try:
+                self._load()
+            except Exception as e:
+                print(f"Factor reload error: {str(e)}")
+
+    def save(self, user_ids, item_ids, user_factors: np.ndarray, item_factors: np.ndarray):
+        """
+        Write a build to a new directory, switch index.json to it and serve
+        it. Each save gets a fresh directory, published by rename once
+        complete, so files that readers have memory-mapped are never
+        rewritten.
+        """
+        self.factor_dir.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.factor_dir, prefix=".build-"))
+
+        np.save(tmp_dir / "user_ids.npy", np.asarray(user_ids, dtype=str))
+        np.save(tmp_dir / "item_ids.npy", np.asarray(item_ids, dtype=str))
+        np.save(tmp_dir / "user_factors.npy", user_factors.astype(np.float32))
+        np.save(tmp_dir / "item_factors.npy", item_factors.astype(np.float32))
+
+        name = f"build-{int(time.time())}-{uuid.uuid4().hex[:12]}"
+        tmp_dir.rename(self.factor_dir / name)
+
+        pointer = self.factor_dir / "index.json"
+        tmp_pointer = self.factor_dir / f".index.json.{os.getpid()}.tmp"
+        with open(tmp_pointer, 'w') as f:
+            json.dump({'directory': name, 'factors': int(user_factors.shape[1])}, f)
+        os.replace(tmp_pointer, pointer)
+
+        # Other saves' temp directories may still be in progress
+        for path in self.factor_dir.iterdir():
+            if path.is_dir() and path.name != name and not path.name.startswith('.'):
+                shutil.rmtree(path, ignore_errors=True)
+
+        self._load()
+
+    def _load(self):
+        pointer = self.factor_dir / "index.json"
+        if not pointer.exists():
+            return
+
+        try:
+            with open(pointer, 'r') as f:
+                meta = json.load(f)
+            if self._state is not None and self._state[0] == meta['directory']:
+                return
+
+            build_dir = self.factor_dir / meta['directory']
+            user_ids = np.load(build_dir / "user_ids.npy")
+            item_ids = np.load(build_dir / "item_ids.npy")
+
+            self._state = (
+                meta['directory'],
+                {str(user_id): row for row, user_id in enumerate(user_ids)},
+                np.load(build_dir / "user_factors.npy", mmap_mode='r'),
+                {str(item_id): row for row, item_id in enumerate(item_ids)},
+                np.load(build_dir / "item_factors.npy", mmap_mode='r')
+            )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable factors: {str(e)}")
+
+factor_store: FactorStore
+
+__getattr__ = lazy_singletons(__name__, {
+    'factor_store': lambda: FactorStore(settings.CF_FACTORS_DIR)
+})
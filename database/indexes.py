@@ -0,0 +1,283 @@
+import re
+from bisect import bisect_left, insort
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from database.chunked import ChunkedDict, ChunkedSet, intersect
+
+# Query parameter name -> product field holding the value(s)
+INDEXED_FIELDS = {
+    'gender': 'gender',
+    'age_group': 'age_groups',
+    'style': 'style',
+    'category': 'category',
+    'color': 'colors',
+    'body_type': 'body_types_suited',
+}
+
+# Product field -> relevance weight for full-text search
+SEARCH_FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'style': 2.0,
+    'colors': 1.0,
+    'tags': 1.0,
+}
+
+# Score multiplier when a query token only matches as a prefix
+PREFIX_MATCH_FACTOR = 0.5
+MIN_PREFIX_LENGTH = 2
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+@lru_cache(maxsize=65536)
+def _tokenize_cached(text: str) -> Tuple[str, ...]:
+    tokens = []
+
+    for word in text.lower().split():
+        parts = _TOKEN_PATTERN.findall(word)
+        tokens.extend(parts)
+        if len(parts) > 1:
+            tokens.append(''.join(parts))
+
+    return tuple(tokens)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase alphanumeric tokens. Hyphenated words also yield their
+    joined form so "T-Shirt" matches both "shirt" and "tshirt".
+    Catalog values repeat heavily (styles, colors, categories), so
+    results are memoized.
+    """
+    return list(_tokenize_cached(str(text)))
+
+class AttributeIndex:
+    """
+    Inverted index over categorical product attributes.
+    Maps field -> value -> set of catalog rows (the snapshot's sequence
+    numbers) so filters cost O(size of the smallest posting) instead of
+    a catalog scan, and results sort into catalog order as plain ints.
+
+    copy() is cheap: postings are ChunkedSets shared with the source,
+    and the copy's first write to one copies only the touched bucket.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, ChunkedSet]] = {
+            field: {} for field in INDEXED_FIELDS.values()
+        }
+        # (field, value) keys this instance may mutate; None means all of them
+        self._owned: Optional[Set] = None
+
+    def copy(self) -> 'AttributeIndex':
+        index = AttributeIndex.__new__(AttributeIndex)
+        index.postings = {field: dict(values) for field, values in self.postings.items()}
+        index._owned = set()
+        return index
+
+    def _writable(self, field: str, value: str) -> ChunkedSet:
+        postings = self.postings[field]
+        posting = postings.get(value)
+
+        if posting is None:
+            posting = postings[value] = ChunkedSet()
+        elif self._owned is not None and (field, value) not in self._owned:
+            posting = postings[value] = posting.copy()
+
+        if self._owned is not None:
+            self._owned.add((field, value))
+
+        return posting
+
+    @staticmethod
+    def _field_values(product: Dict, field: str) -> Iterable[str]:
+        value = product.get(field)
+
+        if value is None:
+            return []
+
+        if isinstance(value, (list, tuple, set)):
+            return value
+
+        return [value]
+
+    def add(self, product: Dict, row: int):
+        for field in self.postings:
+            for value in self._field_values(product, field):
+                self._writable(field, value).add(row)
+
+    def remove(self, product: Dict, row: int):
+        for field, postings in self.postings.items():
+            for value in self._field_values(product, field):
+                if value not in postings:
+                    continue
+
+                posting = self._writable(field, value)
+                posting.discard(row)
+                if not posting:
+                    del postings[value]
+
+    def lookup(self, filters: Dict[str, Optional[str]]) -> Optional[Set[int]]:
+        """
+        Intersect postings for the given query filters.
+        Returns None when no filter is active (i.e. "everything").
+        """
+
+        selected: List[ChunkedSet] = []
+
+        for name, value in filters.items():
+            if value is None:
+                continue
+
+            if name not in INDEXED_FIELDS:
+                raise ValueError(f"Unknown filter: {name}")
+
+            posting = self.postings[INDEXED_FIELDS[name]].get(value)
+            if not posting:
+                return set()
+
+            selected.append(posting)
+
+        if not selected:
+            return None
+
+        return intersect(selected)
+
+class SearchIndex:
+    """
+    Token index for product search. Postings map token -> catalog row ->
+    field weight, and a sorted vocabulary per two-letter prefix serves
+    prefix expansion with a bisect, so queries never touch products that
+    cannot match. Copies share postings copy-on-write like AttributeIndex.
+    """
+
+    def __init__(self):
+        self.postings: ChunkedDict = ChunkedDict()  # token -> ChunkedDict of row -> weight
+        self.vocabulary: Dict[str, List[str]] = {}
+        # Tokens / vocabulary prefixes this instance may mutate; None means all of them
+        self._owned: Optional[Set[str]] = None
+        self._owned_words: Optional[Set[str]] = None
+
+    def copy(self) -> 'SearchIndex':
+        index = SearchIndex.__new__(SearchIndex)
+        index.postings = self.postings.copy()
+        index.vocabulary = dict(self.vocabulary)
+        index._owned = set()
+        index._owned_words = set()
+        return index
+
+    def _writable(self, token: str) -> Optional[ChunkedDict]:
+        posting = self.postings.get(token)
+
+        if posting is not None and self._owned is not None and token not in self._owned:
+            posting = self.postings[token] = posting.copy()
+
+        if self._owned is not None:
+            self._owned.add(token)
+
+        return posting
+
+    def _writable_words(self, prefix: str) -> List[str]:
+        words = self.vocabulary.get(prefix)
+
+        if words is None:
+            words = self.vocabulary[prefix] = []
+        elif self._owned_words is not None and prefix not in self._owned_words:
+            words = self.vocabulary[prefix] = list(words)
+
+        if self._owned_words is not None:
+            self._owned_words.add(prefix)
+
+        return words
+
+    @staticmethod
+    def _token_weights(product: Dict) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            for text in AttributeIndex._field_values(product, field):
+                for token in _tokenize_cached(str(text)):
+                    if weights.get(token, 0) < weight:
+                        weights[token] = weight
+
+        return weights
+
+    def add(self, product: Dict, row: int):
+        for token, weight in self._token_weights(product).items():
+            posting = self._writable(token)
+            if posting is None:
+                posting = self.postings[token] = ChunkedDict()
+                if len(token) >= MIN_PREFIX_LENGTH:
+                    insort(self._writable_words(token[:MIN_PREFIX_LENGTH]), token)
+            posting[row] = weight
+
+    def remove(self, product: Dict, row: int):
+        # Published products are frozen, so this yields the tokens add() indexed
+        for token in self._token_weights(product):
+            if token not in self.postings:
+                continue
+
+            posting = self._writable(token)
+
+            posting.pop(row, None)
+            if not posting:
+                self.postings.pop(token)
+                if len(token) >= MIN_PREFIX_LENGTH:
+                    words = self._writable_words(token[:MIN_PREFIX_LENGTH])
+                    del words[bisect_left(words, token)]
+                    if not words:
+                        del self.vocabulary[token[:MIN_PREFIX_LENGTH]]
+
+    def _expand(self, query_token: str) -> List[str]:
+        if len(query_token) < MIN_PREFIX_LENGTH:
+            return [query_token] if query_token in self.postings else []
+
+        tokens = []
+        words = self.vocabulary.get(query_token[:MIN_PREFIX_LENGTH], [])
+        position = bisect_left(words, query_token)
+
+        while position < len(words) and words[position].startswith(query_token):
+            tokens.append(words[position])
+            position += 1
+
+        return tokens
+
+    def search(self, query: str) -> Dict[int, float]:
+        """
+        Score every product matching all query tokens (exact or prefix).
+        Returns catalog row -> relevance score.
+        """
+
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return {}
+
+        per_token: List[Dict[int, float]] = []
+
+        for query_token in query_tokens:
+            matches: Dict[int, float] = {}
+
+            for token in self._expand(query_token):
+                factor = 1.0 if token == query_token else PREFIX_MATCH_FACTOR
+                for row, weight in self.postings[token].items():
+                    score = weight * factor
+                    if matches.get(row, 0) < score:
+                        matches[row] = score
+
+            if not matches:
+                return {}
+
+            per_token.append(matches)
+
+        per_token.sort(key=len)
+        scores = dict(per_token[0])
+
+        for matches in per_token[1:]:
+            scores = {
+                row: score + matches[row]
+                for row, score in scores.items()
+                if row in matches
+            }
+            if not scores:
+                break
+
+        return scores
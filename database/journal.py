@@ -0,0 +1,219 @@
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process writers only
+    fcntl = None
+
+def atomic_write_json(path: Path, data, fsync: bool = True):
+    """Write JSON to a temp file in the same directory and rename it over path"""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(path.parent, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def apply_entry(products: Dict[str, Dict], entry: Dict) -> Dict[str, Dict]:
+    """Apply one journal entry to an ordered product_id -> product map"""
+    op = entry.get('op')
+
+    if op == 'add':
+        product = entry['product']
+        products.setdefault(product['product_id'], product)
+
+    elif op == 'update':
+        product_id = entry['product_id']
+        product = products.get(product_id)
+        if product is not None:
+            product.update(entry['updates'])
+            if product['product_id'] != product_id:
+                # Re-key in place so catalog order survives an id change
+                products = {
+                    (p['product_id'] if key == product_id else key): p
+                    for key, p in products.items()
+                }
+
+    elif op == 'delete':
+        products.pop(entry['product_id'], None)
+
+    return products
+
+class CatalogJournal:
+    """
+    Snapshot + append-only journal persistence for the product catalog.
+
+    Mutations append one JSON line each (O(change) bytes), and once the
+    journal holds `compact_every` entries (or as many as the catalog has
+    products) the live catalog is written to a fresh snapshot which
+    atomically replaces the old one. Each entry carries a
+    monotonically increasing version so replay can skip entries that are
+    already folded into the snapshot after a crash mid-compaction.
+    """
+
+    def __init__(self, snapshot_file: Path, compact_every: int = 1000, fsync: bool = False):
+        self.snapshot_file = snapshot_file
+        self.journal_file = snapshot_file.with_suffix('.journal')
+        self.lock_file = snapshot_file.with_name(f".{snapshot_file.stem}.lock")
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.version = 0
+        self.pending_entries = 0
+        # How far this process has consumed the journal, and which snapshot it is based on
+        self.offset = 0
+        self.snapshot_signature: Optional[Tuple[int, int, int]] = None
+
+    def exists(self) -> bool:
+        return self.snapshot_file.exists()
+
+    @contextmanager
+    def locked(self):
+        """Serialize writers across worker processes"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _current_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = self.snapshot_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _parse_entries(self, data: bytes) -> Tuple[List[Dict], int]:
+        """Parse complete journal lines; returns (entries, bytes consumed)"""
+        entries = []
+        consumed = 0
+
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError("Unterminated entry")
+                entry = json.loads(line)
+            except ValueError:
+                break
+
+            consumed += len(line)
+            entries.append(entry)
+
+        return entries, consumed
+
+    def _take_new(self, entries: List[Dict]) -> List[Dict]:
+        fresh = [entry for entry in entries if entry.get('v', 0) > self.version]
+
+        if fresh:
+            self.version = fresh[-1]['v']
+            self.pending_entries += len(fresh)
+
+        return fresh
+
+    def load(self) -> List[Dict]:
+        self.snapshot_signature = self._current_signature()
+
+        with open(self.snapshot_file, 'r') as f:
+            data = json.load(f)
+
+        self.version = data.get('version', 0)
+        products = {p['product_id']: p for p in data.get('products', [])}
+        self.pending_entries = 0
+        self.offset = 0
+
+        if self.journal_file.exists():
+            # Read-only: bytes past the last complete line may be another
+            # worker's append in flight; append() drops a real torn tail
+            with open(self.journal_file, 'rb') as f:
+                entries, self.offset = self._parse_entries(f.read())
+
+            for entry in self._take_new(entries):
+                products = apply_entry(products, entry)
+
+        return list(products.values())
+
+    def read_new_entries(self) -> Optional[List[Dict]]:
+        """
+        Entries appended since the last load/read, e.g. by another worker.
+        Returns None when the snapshot itself was replaced and a full
+        reload is required.
+        """
+        if self._current_signature() != self.snapshot_signature:
+            return None
+
+        try:
+            with open(self.journal_file, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        entries, consumed = self._parse_entries(data)
+        self.offset += consumed
+        return self._take_new(entries)
+
+    def append(self, entries: List[Dict]) -> int:
+        """
+        Stamp entries with versions and append them in a single write.
+        Caller holds locked() and has read the journal up to self.offset.
+        """
+        lines = []
+
+        for entry in entries:
+            self.version += 1
+            lines.append(json.dumps({'v': self.version, **entry}, separators=(',', ':')))
+
+        payload = ('\n'.join(lines) + '\n').encode()
+
+        with open(self.journal_file, 'ab') as f:
+            if f.tell() > self.offset:
+                # Drop a torn tail left by an interrupted append; no one
+                # else can be writing while we hold the lock
+                f.truncate(self.offset)
+            f.write(payload)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+        self.offset += len(payload)
+        self.pending_entries += len(entries)
+        return self.version
+
+    def needs_compaction(self, catalog_size: int = 0) -> bool:
+        # Let the journal grow with the catalog so bulk loads stay amortized O(change)
+        return self.pending_entries >= max(self.compact_every, catalog_size)
+
+    def seed(self, products: List[Dict]):
+        self.compact(products)
+
+    def compact(self, products: List[Dict]):
+        atomic_write_json(
+            self.snapshot_file,
+            {'version': self.version, 'products': products}
+        )
+
+        # Entries up to self.version now live in the snapshot
+        if self.journal_file.exists():
+            self.journal_file.unlink()
+
+        self.pending_entries = 0
+        self.offset = 0
+        self.snapshot_signature = self._current_signature()
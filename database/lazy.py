@@ -0,0 +1,25 @@
+import sys
+import threading
+from typing import Any, Callable, Dict
+
+def lazy_singletons(module: str, factories: Dict[str, Callable[[], Any]]) -> Callable[[str], Any]:
+    """
+    A module-level __getattr__ (PEP 562) that builds each named singleton
+    on first access and stores it on the module. Importing the module for
+    its classes therefore loads no data and starts no threads; the app
+    builds them when its routers import them.
+    """
+    lock = threading.Lock()
+
+    def __getattr__(name: str):
+        if name not in factories:
+            raise AttributeError(f"module {module!r} has no attribute {name!r}")
+
+        namespace = vars(sys.modules[module])
+        with lock:
+            if name not in namespace:
+                namespace[name] = factories[name]()
+
+        return namespace[name]
+
+    return __getattr__
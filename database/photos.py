@@ -0,0 +1,129 @@
+import json
+import hashlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+from PIL import Image
+from config import settings
+from database.lazy import lazy_singletons
+from database.sqlite import SqliteConnectionPool
+from utils.sharding import find_sharded, sharded_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    photo_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    extension TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    size_bytes INTEGER,
+    sha256 TEXT,
+    quality TEXT,
+    uploaded_at TEXT
+);
+"""
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PhotoRegistry:
+    """
+    Persistent photo_id -> metadata index for uploaded photos, kept in
+    the DATABASE_URL SQLite database so every worker shares it. Upload
+    registers each photo with its dimensions, content hash and quality
+    info, so lookups are a primary-key read instead of a directory scan
+    and quality is never recomputed. Photos uploaded before the registry
+    existed are found on disk once and registered on first lookup.
+    """
+
+    def __init__(self, database_url: str, uploads_dir: Path):
+        self.pool = SqliteConnectionPool(database_url)
+        self.uploads_dir = uploads_dir
+
+        self.pool.connection().executescript(SCHEMA)
+
+    def register(
+        self,
+        photo_id: str,
+        photo_path: Path,
+        sha256: Optional[str] = None,
+        quality: Optional[Dict] = None
+    ) -> Dict:
+        """Record a stored photo; the hash is computed if not given"""
+        with Image.open(photo_path) as image:
+            width, height = image.size
+
+        photo = {
+            'photo_id': photo_id,
+            'filename': photo_path.name,
+            'extension': photo_path.suffix.lower(),
+            'width': width,
+            'height': height,
+            'size_bytes': photo_path.stat().st_size,
+            'sha256': sha256 or file_sha256(photo_path),
+            'quality': quality,
+            'uploaded_at': datetime.now().isoformat()
+        }
+
+        self.pool.connection().execute(
+            "INSERT OR REPLACE INTO photos "
+            "(photo_id, filename, extension, width, height, size_bytes, sha256, quality, uploaded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                photo['photo_id'], photo['filename'], photo['extension'],
+                photo['width'], photo['height'], photo['size_bytes'], photo['sha256'],
+                json.dumps(quality) if quality is not None else None,
+                photo['uploaded_at']
+            )
+        )
+
+        photo['path'] = photo_path
+        return photo
+
+    def set_quality(self, photo_id: str, quality: Dict):
+        self.pool.connection().execute(
+            "UPDATE photos SET quality = ? WHERE photo_id = ?", (json.dumps(quality), photo_id)
+        )
+
+    def get(self, photo_id: str) -> Optional[Dict]:
+        """Registered metadata plus the photo's current 'path', or None"""
+        row = self.pool.connection().execute(
+            "SELECT * FROM photos WHERE photo_id = ?", (photo_id,)
+        ).fetchone()
+
+        if row is not None:
+            photo = dict(row)
+            photo['quality'] = json.loads(photo['quality']) if photo['quality'] else None
+            photo['path'] = sharded_path(self.uploads_dir, photo['filename'])
+
+            if photo['path'].exists():
+                return photo
+
+            # Removed behind our back
+            self.remove(photo_id)
+            return None
+
+        photo_path = find_sharded(self.uploads_dir, photo_id)
+        if photo_path is None:
+            return None
+
+        try:
+            return self.register(photo_id, photo_path)
+        except OSError:
+            return None
+
+    def remove(self, photo_id: str) -> bool:
+        cursor = self.pool.connection().execute(
+            "DELETE FROM photos WHERE photo_id = ?", (photo_id,)
+        )
+        return cursor.rowcount > 0
+
+photo_registry: PhotoRegistry
+
+__getattr__ = lazy_singletons(__name__, {
+    'photo_registry': lambda: PhotoRegistry(settings.DATABASE_URL, settings.UPLOADS_DIR)
+})
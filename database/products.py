@@ -1,18 +1,106 @@
 import json
-from pathlib import Path
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Union
 from config import settings
+from database.catalog import CatalogSnapshot
+from database.cursors import decode_cursor, encode_cursor
+from database.journal import CatalogJournal
+from database.lazy import lazy_singletons
+from database.sqlite_catalog import SqliteCatalogStore
+
+# Product record schema, mirroring the sample catalog: field -> allowed types
+PRODUCT_SCHEMA = {
+    'product_id': str,
+    'name': str,
+    'category': str,
+    'gender': str,
+    'age_groups': list,
+    'style': str,
+    'body_types_suited': list,
+    'colors': list,
+    'sizes': list,
+    'price': (int, float),
+    'image_path': str,
+    'popularity_score': (int, float),
+}
+
+# Fields whose values must come from a fixed vocabulary in settings
+PRODUCT_VOCABULARIES = {
+    'gender': settings.GENDER_CATEGORIES,
+    'age_groups': settings.AGE_GROUPS,
+    'style': settings.STYLE_CATEGORIES,
+    'body_types_suited': settings.BODY_TYPES,
+}
+
+def validate_product(record) -> Optional[str]:
+    """Return an error message if record doesn't match PRODUCT_SCHEMA, else None"""
+    if not isinstance(record, dict):
+        return "Record must be a JSON object"
+    
+    for field, expected_type in PRODUCT_SCHEMA.items():
+        if field not in record:
+            return f"Missing field: {field}"
+        
+        value = record[field]
+        if not isinstance(value, expected_type) or isinstance(value, bool):
+            return f"Invalid type for field: {field}"
+        
+        if isinstance(value, list) and not all(isinstance(item, str) for item in value):
+            return f"Field {field} must be a list of strings"
+    
+    if not record['product_id']:
+        return "Empty product_id"
+    
+    if record['price'] < 0:
+        return "Price must not be negative"
+    
+    for field, vocabulary in PRODUCT_VOCABULARIES.items():
+        values = record[field] if isinstance(record[field], list) else [record[field]]
+        for value in values:
+            if value not in vocabulary:
+                return f"Unknown {field} value: {value}"
+    
+    return None
 
 class ProductDatabase:
     def __init__(self):
         self.products_file = settings.BASE_DIR / "products.json"
-        self.products = self._load_products()
+        self.storage = self._create_storage()
+        self._write_lock = threading.Lock()
+        # Published version = storage version + this; see _catch_up
+        self._version_offset = 0
+        
+        with self.storage.locked():
+            self.snapshot = CatalogSnapshot.build(self._load_products(), self.storage.version)
+            
+            if self.storage.needs_compaction(len(self.snapshot)):
+                self.storage.compact(self.snapshot.products)
+        
+        if settings.CATALOG_RELOAD_INTERVAL > 0:
+            threading.Thread(target=self._watch, daemon=True).start()
+    
+    def _create_storage(self):
+        if settings.PRODUCT_STORAGE == "sqlite":
+            return SqliteCatalogStore(
+                settings.DATABASE_URL,
+                compact_every=settings.PRODUCT_JOURNAL_COMPACT_EVERY
+            )
+        
+        return CatalogJournal(
+            self.products_file,
+            compact_every=settings.PRODUCT_JOURNAL_COMPACT_EVERY,
+            fsync=settings.PRODUCT_JOURNAL_FSYNC
+        )
     
     def _load_products(self) -> List[Dict]:
-        if self.products_file.exists():
-            with open(self.products_file, 'r') as f:
-                data = json.load(f)
-                return data.get('products', [])
+        if self.storage.exists():
+            return self.storage.load()
+        elif self.products_file.exists():
+            # Fresh backend: seed it from the JSON catalog
+            products = CatalogJournal(self.products_file).load()
+            self.storage.seed(products)
+            return products
         else:
             return self._create_sample_products()
     
@@ -90,57 +178,218 @@ class ProductDatabase:
             }
         ]
         
-        self._save_products(sample_products)
+        self.storage.seed(sample_products)
         return sample_products
     
-    def _save_products(self, products: List[Dict]):
-        with open(self.products_file, 'w') as f:
-            json.dump({'products': products}, f, indent=2)
+    @property
+    def products(self) -> List[Dict]:
+        return self.snapshot.products
+    
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+    
+    def _catch_up(self):
+        """Fold in changes other workers wrote to disk; caller holds the write lock"""
+        entries = self.storage.read_new_entries()
+        
+        if entries is None:
+            products = self.storage.load()
+            # A replaced catalog (e.g. products.json edited by hand) can
+            # carry a version we already published; never reuse one
+            self._version_offset = max(0, self.snapshot.version + 1 - self.storage.version)
+            self.snapshot = CatalogSnapshot.build(products, self.storage.version + self._version_offset)
+        elif entries:
+            self.snapshot = self.snapshot.apply(entries, self.storage.version + self._version_offset)
+    
+    def refresh(self):
+        with self._write_lock:
+            self._catch_up()
+    
+    def _watch(self):
+        while True:
+            time.sleep(settings.CATALOG_RELOAD_INTERVAL)
+            try:
+                self.refresh()
+                # Build the scoring columns here so requests don't pay for it
+                self.snapshot.columns
+            except Exception as e:
+                print(f"Catalog reload error: {str(e)}")
+    
+    def _commit(self, build_entries) -> bool:
+        """
+        Run a mutation: catch up with disk, let build_entries(snapshot)
+        produce journal entries (or nothing), persist them and publish
+        the derived snapshot.
+        """
+        with self._write_lock, self.storage.locked():
+            self._catch_up()
+            
+            entries = build_entries(self.snapshot)
+            if not entries:
+                return False
+            
+            version = self.storage.append(entries)
+            self.snapshot = self.snapshot.apply(entries, version + self._version_offset)
+            
+            if self.storage.needs_compaction(len(self.snapshot)):
+                self.storage.compact(self.snapshot.products)
+            
+            return True
+    
+    def query_products(self, **filters) -> List[Dict]:
+        if isinstance(self.storage, SqliteCatalogStore):
+            products, _, _ = self.storage.page_products(filters)
+            return products
+        return self.snapshot.query_products(**filters)
+    
+    def page_products(
+        self,
+        filters: Dict[str, Optional[str]],
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], int, Optional[str]]:
+        """
+        Filtered keyset page, see CatalogSnapshot.page_products. With the
+        SQLite backend it is read from the shared database's indexes, so
+        a cursor handed out by one worker is valid on every other.
+        """
+        if not isinstance(self.storage, SqliteCatalogStore):
+            return self.snapshot.page_products(filters, limit, cursor)
+        
+        after = -1
+        if cursor:
+            after = decode_cursor(cursor)
+            if not isinstance(after, int):
+                raise ValueError("Invalid cursor")
+        
+        products, total, next_after = self.storage.page_products(filters, limit, after)
+        next_cursor = encode_cursor(next_after) if next_after is not None else None
+        
+        return products, total, next_cursor
     
     def get_all_products(self) -> List[Dict]:
-        return self.products
+        return self.snapshot.products
     
     def get_product_by_id(self, product_id: str) -> Optional[Dict]:
-        for product in self.products:
-            if product['product_id'] == product_id:
-                return product
-        return None
+        return self.snapshot.get_product_by_id(product_id)
+    
+    def get_products_by_ids(self, product_ids: List[str]) -> List[Dict]:
+        return self.snapshot.get_products_by_ids(product_ids)
+    
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], int, Optional[str]]:
+        return self.snapshot.search(query, limit, cursor)
     
     def search_products(self, query: str) -> List[Dict]:
-        query_lower = query.lower()
-        results = []
+        results, _, _ = self.snapshot.search(query)
+        return results
+    
+    def import_products(
+        self,
+        lines: Iterable[Union[str, bytes]],
+        batch_size: int = None,
+        max_errors: int = 100
+    ) -> Iterator[Dict]:
+        """
+        Stream NDJSON product records into the catalog. Records are
+        validated, deduplicated against the id index and within the feed,
+        and persisted one journal write + one snapshot per batch.
+        Yields running totals after every batch; the last one is final.
+        """
+        batch_size = batch_size or settings.PRODUCT_IMPORT_BATCH_SIZE
+        stats = {
+            'processed': 0,
+            'imported': 0,
+            'duplicates': 0,
+            'invalid': 0,
+            'errors': [],
+            'done': False
+        }
+        batch: List[Dict] = []
         
-        for product in self.products:
-            if (query_lower in product['name'].lower() or
-                query_lower in product['category'].lower() or
-                query_lower in product['style'].lower()):
-                results.append(product)
+        def reject(line_number: int, message: str):
+            stats['invalid'] += 1
+            if len(stats['errors']) < max_errors:
+                stats['errors'].append({'line': line_number, 'error': message})
         
-        return results
+        def flush():
+            def build(snapshot):
+                seen = set()
+                entries = []
+                
+                for record in batch:
+                    product_id = record['product_id']
+                    if product_id in snapshot or product_id in seen:
+                        stats['duplicates'] += 1
+                        continue
+                    
+                    seen.add(product_id)
+                    entries.append({'op': 'add', 'product': record})
+                
+                stats['imported'] += len(entries)
+                return entries
+            
+            self._commit(build)
+            batch.clear()
+        
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            
+            stats['processed'] += 1
+            
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                reject(line_number, f"Invalid JSON: {str(e)}")
+                continue
+            
+            error = validate_product(record)
+            if error:
+                reject(line_number, error)
+                continue
+            
+            batch.append(record)
+            
+            if len(batch) >= batch_size:
+                flush()
+                yield dict(stats)
+        
+        if batch:
+            flush()
+        
+        stats['done'] = True
+        yield dict(stats)
     
     def add_product(self, product: Dict) -> bool:
-        if self.get_product_by_id(product['product_id']):
-            return False
+        def build(snapshot):
+            if product['product_id'] in snapshot:
+                return []
+            return [{'op': 'add', 'product': product}]
         
-        self.products.append(product)
-        self._save_products(self.products)
-        return True
+        return self._commit(build)
     
     def update_product(self, product_id: str, updates: Dict) -> bool:
-        for i, product in enumerate(self.products):
-            if product['product_id'] == product_id:
-                self.products[i].update(updates)
-                self._save_products(self.products)
-                return True
-        return False
+        def build(snapshot):
+            if product_id not in snapshot:
+                return []
+            return [{'op': 'update', 'product_id': product_id, 'updates': updates}]
+        
+        return self._commit(build)
     
     def delete_product(self, product_id: str) -> bool:
-        original_length = len(self.products)
-        self.products = [p for p in self.products if p['product_id'] != product_id]
+        def build(snapshot):
+            if product_id not in snapshot:
+                return []
+            return [{'op': 'delete', 'product_id': product_id}]
         
-        if len(self.products) < original_length:
-            self._save_products(self.products)
-            return True
-        return False
+        return self._commit(build)
+
+product_db: ProductDatabase
 
-product_db = ProductDatabase()
\ No newline at end of file
+__getattr__ = lazy_singletons(__name__, {'product_db': ProductDatabase})
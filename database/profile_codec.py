@@ -0,0 +1,110 @@
+import json
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterator, List, TextIO, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # Only needed when USER_PROFILE_FORMAT is "msgpack"
+    msgpack = None
+
+# Frame: magic, schema version, flags, payload length, then the
+# MessagePack payload (zlib-compressed when FLAG_COMPRESSED is set)
+MAGIC = b'SF'
+SCHEMA_VERSION = 1
+FLAG_COMPRESSED = 0x01
+FRAME_HEADER = struct.Struct('>2sBBI')
+
+def _require_msgpack():
+    if msgpack is None:
+        raise RuntimeError("The msgpack package is required for the binary profile format")
+
+def pack_frame(obj, compress: bool = False) -> bytes:
+    _require_msgpack()
+    payload = msgpack.packb(obj, use_bin_type=True)
+    flags = 0
+
+    if compress:
+        payload = zlib.compress(payload)
+        flags |= FLAG_COMPRESSED
+
+    return FRAME_HEADER.pack(MAGIC, SCHEMA_VERSION, flags, len(payload)) + payload
+
+def iter_frames(data: bytes) -> Iterator[Tuple[object, int]]:
+    """Decoded frames with the offset after each; stops at a torn tail"""
+    _require_msgpack()
+    offset = 0
+
+    while offset + FRAME_HEADER.size <= len(data):
+        magic, version, flags, length = FRAME_HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            raise ValueError("Not a binary profile frame")
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"Unsupported profile schema version: {version}")
+
+        start = offset + FRAME_HEADER.size
+        if start + length > len(data):
+            break
+
+        payload = data[start:start + length]
+        if flags & FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+
+        offset = start + length
+        yield msgpack.unpackb(payload, raw=False), offset
+
+def is_binary(data: Union[bytes, str]) -> bool:
+    return isinstance(data, bytes) and data[:len(MAGIC)] == MAGIC
+
+def encode_profile(user_profile: Dict, binary: bool) -> Union[bytes, str]:
+    if binary:
+        return pack_frame(user_profile)
+    return json.dumps(user_profile, indent=2)
+
+def decode_profile(data: Union[bytes, str]) -> Dict:
+    """Read either format: binary frames are recognised by their magic"""
+    if is_binary(data):
+        for user_profile, _ in iter_frames(data):
+            return user_profile
+        raise ValueError("Truncated binary profile")
+    return json.loads(data)
+
+def encode_records(records: List[Dict], binary: bool, compress: bool = False) -> Union[bytes, str]:
+    """Log records as one frame, or as JSON lines"""
+    if binary:
+        return pack_frame(records, compress)
+    return ''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records)
+
+def read_frames(f: BinaryIO) -> Iterator[object]:
+    """Decode frames one at a time from a file; stops at a torn tail"""
+    _require_msgpack()
+
+    while True:
+        header = f.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return
+
+        magic, version, flags, length = FRAME_HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("Not a binary profile frame")
+        if version > SCHEMA_VERSION:
+            raise ValueError(f"Unsupported profile schema version: {version}")
+
+        payload = f.read(length)
+        if len(payload) < length:
+            return
+
+        if flags & FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+
+        yield msgpack.unpackb(payload, raw=False)
+
+def read_json_lines(f: TextIO) -> Iterator[Dict]:
+    for line in f:
+        if not line.endswith('\n'):
+            # Torn tail from an interrupted append
+            return
+        try:
+            yield json.loads(line)
+        except ValueError:
+            return
@@ -0,0 +1,358 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from config import settings
+from database.lazy import lazy_singletons
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process writers only
+    fcntl = None
+
+# Bound on the signature-by-signature score matrix built at once
+SCORE_BLOCK_CELLS = 4 * 1024 * 1024
+
+def _signature(product: Dict) -> Tuple:
+    """Everything similarity looks at; products sharing it rank identically"""
+    return (
+        product.get('style'),
+        product.get('category'),
+        frozenset(product.get('colors', []))
+    )
+
+class SimilarityIndex:
+    """
+    Precomputed top-K similar products per product, served in O(K).
+
+    Similarity is RecommendationEngine.get_similar_products' score: 3
+    for the same style, 2 for the same category, 1 per shared color.
+    Products are grouped by (style, category, colors) signature, so the
+    neighbor list is computed once per signature by walking score tiers
+    over signatures instead of scoring every product pair.
+
+    A background thread follows the catalog version. On a change only
+    the signatures whose lists can be affected are recomputed: those
+    that listed a removed or modified product, and those for which a
+    new or modified product scores at least their current K-th
+    neighbor. Each build is saved as .npy arrays that are memory-mapped
+    on startup.
+    """
+
+    def __init__(self, catalog_db, index_dir: Path, k: int):
+        self.catalog_db = catalog_db
+        self.index_dir = index_dir
+        self.k = k
+        self._state = None  # (version, row_of, product_ids, neighbors, scores)
+        self._build_lock = threading.Lock()
+        self._reset_builder()
+
+        self._load()
+
+        if settings.SIMILARITY_REFRESH_INTERVAL > 0:
+            threading.Thread(target=self._watch, daemon=True).start()
+
+    def _reset_builder(self):
+        # Incremental build state, in memory only
+        self._snapshot = None
+        self._signature_ids: Dict[Tuple, int] = {}
+        self._value_codes: Tuple[Dict, Dict, Dict] = ({}, {}, {})
+        self._sig_style = np.zeros(0, dtype=np.int32)
+        self._sig_category = np.zeros(0, dtype=np.int32)
+        self._sig_colors = np.zeros((0, 0), dtype=np.float32)
+        self._inverse = np.zeros(0, dtype=np.int64)
+        self._sig_neighbors = np.zeros((0, self.k + 1), dtype=np.int32)
+        self._sig_scores = np.zeros((0, self.k + 1), dtype=np.int16)
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._state[0] if self._state else None
+
+    def neighbors(self, product_id: str, limit: int) -> Optional[List[Tuple[str, int]]]:
+        """(product_id, score) of the limit most similar products, or None if not indexed"""
+        state = self._state
+        if state is None or limit > self.k:
+            return None
+
+        _, row_of, product_ids, neighbors, scores = state
+        row = row_of.get(product_id)
+        if row is None:
+            return None
+
+        return [
+            (str(product_ids[neighbor]), int(score))
+            for neighbor, score in zip(neighbors[row, :limit], scores[row, :limit])
+            if neighbor >= 0
+        ]
+
+    def _watch(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Similarity index build error: {str(e)}")
+            time.sleep(settings.SIMILARITY_REFRESH_INTERVAL)
+
+    def refresh(self) -> bool:
+        """Bring the index up to the current catalog; returns whether it changed"""
+        with self._build_lock:
+            snapshot = self.catalog_db.snapshot
+            if self._snapshot is snapshot or (self._snapshot is None and self.version == snapshot.version):
+                return False
+
+            self._update(snapshot)
+            self._save()
+            return True
+
+    def rebuild(self):
+        """Full build from scratch, e.g. from the offline job"""
+        with self._build_lock:
+            self._reset_builder()
+            self._update(self.catalog_db.snapshot)
+            self._save()
+
+    # Building
+
+    def _register(self, product: Dict) -> int:
+        key = _signature(product)
+        sig = self._signature_ids.get(key)
+        if sig is None:
+            sig = self._signature_ids[key] = len(self._signature_ids)
+        return sig
+
+    def _extend_signatures(self, start: int):
+        """Grow the per-signature arrays, once, for signatures registered from start on"""
+        keys = list(self._signature_ids)[start:]
+        if not keys:
+            return
+
+        styles, categories, colors = self._value_codes
+        new_style = [styles.setdefault(style, len(styles)) for style, _, _ in keys]
+        new_category = [categories.setdefault(category, len(categories)) for _, category, _ in keys]
+        new_colors = [[colors.setdefault(color, len(colors)) for color in color_set] for _, _, color_set in keys]
+
+        self._sig_style = np.concatenate([self._sig_style, np.array(new_style, dtype=np.int32)])
+        self._sig_category = np.concatenate([self._sig_category, np.array(new_category, dtype=np.int32)])
+
+        # One row per signature, one column per color seen so far
+        sig_colors = np.zeros((start + len(keys), len(colors)), dtype=np.float32)
+        sig_colors[:start, :self._sig_colors.shape[1]] = self._sig_colors
+        for sig, codes in enumerate(new_colors, start):
+            sig_colors[sig, codes] = 1
+        self._sig_colors = sig_colors
+
+        self._sig_neighbors = np.vstack([self._sig_neighbors, np.full((len(keys), self.k + 1), -1, dtype=np.int32)])
+        self._sig_scores = np.vstack([self._sig_scores, np.zeros((len(keys), self.k + 1), dtype=np.int16)])
+
+    def _signature_scores(self, sigs: np.ndarray) -> np.ndarray:
+        """(len(sigs), signatures) similarity scores"""
+        return (
+            3 * (self._sig_style[sigs, None] == self._sig_style[None, :])
+            + 2 * (self._sig_category[sigs, None] == self._sig_category[None, :])
+            + (self._sig_colors[sigs] @ self._sig_colors.T).astype(np.int64)
+        )
+
+    def _tier_rows(self, tier: np.ndarray, rows_by_sig: List[np.ndarray], inverse: np.ndarray, need: int) -> np.ndarray:
+        """First need rows, in catalog order, belonging to any signature in tier"""
+        if len(tier) <= 64:
+            parts = [rows_by_sig[sig][:need] for sig in tier]
+            return np.sort(np.concatenate(parts))[:need] if parts else np.zeros(0, dtype=np.int64)
+
+        in_tier = np.zeros(len(rows_by_sig), dtype=bool)
+        in_tier[tier] = True
+        return np.flatnonzero(in_tier[inverse])[:need]
+
+    def _score_blocks(self, sigs: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """_signature_scores in row blocks of at most SCORE_BLOCK_CELLS scores"""
+        step = max(1, SCORE_BLOCK_CELLS // max(1, len(self._signature_ids)))
+        for start in range(0, len(sigs), step):
+            block = sigs[start:start + step]
+            yield block, self._signature_scores(block)
+
+    def _compute_lists(self, sigs: np.ndarray, rows_by_sig: List[np.ndarray], inverse: np.ndarray):
+        """Top K+1 rows for each signature, best score first, ties in catalog order"""
+        width = self.k + 1
+
+        for block, block_scores in self._score_blocks(sigs):
+            for sig, sig_scores in zip(block, block_scores):
+                rows = np.full(width, -1, dtype=np.int32)
+                scores = np.zeros(width, dtype=np.int16)
+                filled = 0
+
+                for score in np.unique(sig_scores[sig_scores > 0])[::-1]:
+                    tier = np.flatnonzero(sig_scores == score)
+                    tier_rows = self._tier_rows(tier, rows_by_sig, inverse, width - filled)
+                    rows[filled:filled + len(tier_rows)] = tier_rows
+                    scores[filled:filled + len(tier_rows)] = score
+                    filled += len(tier_rows)
+                    if filled == width:
+                        break
+
+                self._sig_neighbors[sig] = rows
+                self._sig_scores[sig] = scores
+
+    def _update(self, snapshot):
+        products = snapshot.products
+        n = len(products)
+        old = self._snapshot
+        inverse = np.empty(n, dtype=np.int64)
+
+        if old is None or not len(old):
+            old = None
+            mapping = np.zeros(0, dtype=np.int64)
+            new_rows = list(range(n))
+        else:
+            # Old row -> new row for products carried over unchanged (published
+            # product dicts are never mutated, so identity means unchanged)
+            row_of = {product['product_id']: row for row, product in enumerate(products)}
+            mapping = np.full(len(old.products), -1, dtype=np.int64)
+            for old_row, product in enumerate(old.products):
+                row = row_of.get(product['product_id'])
+                if row is not None and products[row] is product:
+                    mapping[old_row] = row
+
+            kept = mapping >= 0
+            inverse[mapping[kept]] = self._inverse[kept]
+            carried = np.zeros(n, dtype=bool)
+            carried[mapping[kept]] = True
+            new_rows = np.flatnonzero(~carried).tolist()
+
+        old_signatures = len(self._signature_ids)
+        for row in new_rows:
+            inverse[row] = self._register(products[row])
+        self._extend_signatures(old_signatures)
+
+        signatures = len(self._signature_ids)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.cumsum(np.bincount(inverse, minlength=signatures))[:-1]
+        rows_by_sig = np.split(order, bounds)
+
+        if old is None:
+            dirty = np.ones(signatures, dtype=bool)
+        else:
+            listed = self._sig_neighbors
+            # Lists naming a row that was removed or modified
+            dirty = ((listed >= 0) & (mapping[np.maximum(listed, 0)] < 0)).any(axis=1)
+            self._sig_neighbors = np.where(listed >= 0, mapping[np.maximum(listed, 0)], -1)
+
+            # Lists a new or modified product could enter
+            if new_rows:
+                changed_sigs = np.unique(inverse[new_rows])
+                kth = self._sig_scores[:, -1]
+                for _, challenger in self._score_blocks(changed_sigs):
+                    dirty |= ((challenger > 0) & (challenger >= kth[None, :])).any(axis=0)
+
+            dirty[old_signatures:] = True
+
+        self._compute_lists(np.flatnonzero(dirty), rows_by_sig, inverse)
+        self._inverse = inverse
+        self._snapshot = snapshot
+
+        # Per-product lists: the signature's list without the product itself
+        full = self._sig_neighbors[inverse]
+        full_scores = self._sig_scores[inverse]
+        is_self = full == np.arange(n)[:, None]
+        self_pos = np.where(is_self.any(axis=1), is_self.argmax(axis=1), self.k)
+        columns = np.arange(self.k)[None, :]
+        columns = columns + (columns >= self_pos[:, None])
+
+        neighbors = np.take_along_axis(full, columns, axis=1).astype(np.int32)
+        scores = np.take_along_axis(full_scores, columns, axis=1)
+        product_ids = np.array([product['product_id'] for product in products], dtype=str)
+
+        self._publish(snapshot.version, product_ids, neighbors, scores)
+
+    def _publish(self, version: int, product_ids: np.ndarray, neighbors: np.ndarray, scores: np.ndarray):
+        row_of = {str(product_id): row for row, product_id in enumerate(product_ids)}
+        self._state = (version, row_of, product_ids, neighbors, scores)
+
+    # Persistence
+
+    @contextmanager
+    def _locked(self):
+        """Serialize index writes across worker processes"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.index_dir / ".lock", 'a') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _save(self):
+        """
+        Write arrays to the version's directory, then switch index.json to
+        it. Every worker follows the same catalog, so the directory is
+        shared: a version another worker already saved is not rewritten.
+        """
+        version, _, product_ids, neighbors, scores = self._state
+        name = f"v{version}-k{self.k}"
+        build_dir = self.index_dir / name
+        pointer = self.index_dir / "index.json"
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+
+        with self._locked():
+            if not build_dir.exists():
+                # Complete arrays appear under the final name in one rename
+                tmp_dir = Path(tempfile.mkdtemp(dir=self.index_dir, prefix=".build-"))
+                np.save(tmp_dir / "product_ids.npy", product_ids)
+                np.save(tmp_dir / "neighbors.npy", neighbors)
+                np.save(tmp_dir / "scores.npy", scores)
+                os.replace(tmp_dir, build_dir)
+
+            meta = {'version': version, 'k': self.k, 'directory': name}
+            try:
+                with open(pointer, 'r') as f:
+                    current = json.load(f)
+            except (OSError, ValueError):
+                current = None
+
+            if current != meta:
+                tmp_pointer = self.index_dir / ".index.json.tmp"
+                with open(tmp_pointer, 'w') as f:
+                    json.dump(meta, f)
+                os.replace(tmp_pointer, pointer)
+
+            # Older builds and abandoned temp directories; memory-mapped
+            # files stay readable after unlinking
+            for path in self.index_dir.iterdir():
+                if path.is_dir() and path.name != name:
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def _load(self):
+        pointer = self.index_dir / "index.json"
+        if not pointer.exists():
+            return
+
+        try:
+            with open(pointer, 'r') as f:
+                meta = json.load(f)
+            if meta['k'] != self.k:
+                return
+
+            build_dir = self.index_dir / meta['directory']
+            self._publish(
+                meta['version'],
+                np.load(build_dir / "product_ids.npy", mmap_mode='r'),
+                np.load(build_dir / "neighbors.npy", mmap_mode='r'),
+                np.load(build_dir / "scores.npy", mmap_mode='r')
+            )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable similarity index: {str(e)}")
+
+def _create_similarity_index() -> SimilarityIndex:
+    from database.products import product_db
+    return SimilarityIndex(product_db, settings.SIMILARITY_INDEX_DIR, settings.SIMILARITY_TOP_K)
+
+similarity_index: SimilarityIndex
+
+__getattr__ = lazy_singletons(__name__, {'similarity_index': _create_similarity_index})
@@ -0,0 +1,41 @@
+import sqlite3
+import threading
+from pathlib import Path
+from config import settings
+
+def sqlite_path(database_url: str) -> Path:
+    """Resolve a sqlite:/// URL; relative paths are taken from the project root"""
+    prefix = "sqlite:///"
+    if not database_url.startswith(prefix):
+        raise ValueError(f"Not a SQLite database URL: {database_url}")
+
+    path = Path(database_url[len(prefix):])
+    if not path.is_absolute():
+        path = settings.BASE_DIR / path
+
+    return path
+
+class SqliteConnectionPool:
+    """
+    One SQLite connection per thread of the current worker process,
+    opened lazily in WAL mode so readers never block the writer.
+    """
+
+    def __init__(self, database_url: str):
+        self.path = sqlite_path(database_url)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+
+        if conn is None:
+            # Transactions are managed explicitly with BEGIN/COMMIT
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+
+        return conn
@@ -0,0 +1,283 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from database.sqlite import SqliteConnectionPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    name TEXT,
+    category TEXT,
+    gender TEXT,
+    style TEXT,
+    price REAL,
+    popularity_score REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_seq ON products(seq);
+-- Filter column + seq, so keyset pages are index range scans
+DROP INDEX IF EXISTS idx_products_gender;
+DROP INDEX IF EXISTS idx_products_style;
+DROP INDEX IF EXISTS idx_products_category;
+CREATE INDEX IF NOT EXISTS idx_products_gender_seq ON products(gender, seq);
+CREATE INDEX IF NOT EXISTS idx_products_style_seq ON products(style, seq);
+CREATE INDEX IF NOT EXISTS idx_products_category_seq ON products(category, seq);
+
+CREATE TABLE IF NOT EXISTS product_age_groups (
+    product_id TEXT NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    age_group TEXT NOT NULL,
+    PRIMARY KEY (product_id, age_group)
+);
+CREATE INDEX IF NOT EXISTS idx_product_age_groups ON product_age_groups(age_group, product_id);
+
+CREATE TABLE IF NOT EXISTS product_colors (
+    product_id TEXT NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    color TEXT NOT NULL,
+    PRIMARY KEY (product_id, color)
+);
+CREATE INDEX IF NOT EXISTS idx_product_colors ON product_colors(color, product_id);
+
+CREATE TABLE IF NOT EXISTS product_body_types (
+    product_id TEXT NOT NULL REFERENCES products(product_id) ON DELETE CASCADE,
+    body_type TEXT NOT NULL,
+    PRIMARY KEY (product_id, body_type)
+);
+CREATE INDEX IF NOT EXISTS idx_product_body_types ON product_body_types(body_type, product_id);
+
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    version INTEGER PRIMARY KEY,
+    entry TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Junction table -> (column, product field)
+JUNCTION_TABLES = {
+    'product_age_groups': ('age_group', 'age_groups'),
+    'product_colors': ('color', 'colors'),
+    'product_body_types': ('body_type', 'body_types_suited'),
+}
+
+# Query filter name (as in indexes.INDEXED_FIELDS) -> SQL condition on products p
+SQL_FILTERS = {
+    'gender': "p.gender = ?",
+    'style': "p.style = ?",
+    'category': "p.category = ?",
+    'age_group': "p.product_id IN (SELECT product_id FROM product_age_groups WHERE age_group = ?)",
+    'color': "p.product_id IN (SELECT product_id FROM product_colors WHERE color = ?)",
+    'body_type': "p.product_id IN (SELECT product_id FROM product_body_types WHERE body_type = ?)",
+}
+
+class SqliteCatalogStore:
+    """
+    SQLite storage backend for ProductDatabase, a drop-in for
+    CatalogJournal. Products live in an indexed table with junction
+    tables for the multi-valued attributes, so every uvicorn worker
+    shares one catalog file, and filtered pages are served from it by
+    page_products(). Each mutation is also appended to catalog_changes,
+    which workers tail to update their in-memory snapshot (used for
+    search and scoring) incrementally instead of reloading everything.
+    """
+
+    def __init__(self, database_url: str, compact_every: int = 1000):
+        self.pool = SqliteConnectionPool(database_url)
+        self.compact_every = compact_every
+        self.version = 0
+        self.pending_entries = 0
+
+        self.pool.connection().executescript(SCHEMA)
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.pool.connection().execute(
+            "SELECT value FROM catalog_meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row['value'] if row else None
+
+    def _set_meta(self, key: str, value):
+        self.pool.connection().execute(
+            "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def exists(self) -> bool:
+        return self._meta('initialized') is not None
+
+    @contextmanager
+    def locked(self):
+        """Serialize writers across workers with an immediate write transaction"""
+        conn = self.pool.connection()
+        conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def _insert(self, product: Dict, seq: int):
+        conn = self.pool.connection()
+        product_id = product['product_id']
+
+        conn.execute(
+            "INSERT INTO products "
+            "(product_id, seq, name, category, gender, style, price, popularity_score, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                product_id, seq,
+                product.get('name'), product.get('category'),
+                product.get('gender'), product.get('style'),
+                product.get('price'), product.get('popularity_score'),
+                json.dumps(product, separators=(',', ':'))
+            )
+        )
+
+        for table, (column, field) in JUNCTION_TABLES.items():
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {table} (product_id, {column}) VALUES (?, ?)",
+                [(product_id, value) for value in product.get(field, [])]
+            )
+
+    def _get(self, product_id: str) -> Optional[sqlite3.Row]:
+        return self.pool.connection().execute(
+            "SELECT seq, data FROM products WHERE product_id = ?", (product_id,)
+        ).fetchone()
+
+    def _delete(self, product_id: str):
+        self.pool.connection().execute("DELETE FROM products WHERE product_id = ?", (product_id,))
+
+    def seed(self, products: List[Dict]):
+        """Populate an empty store; caller holds locked()"""
+        for seq, product in enumerate(products):
+            self._insert(product, seq)
+
+        self._set_meta('version', 0)
+        self._set_meta('initialized', 1)
+        self.version = 0
+
+    def load(self) -> List[Dict]:
+        conn = self.pool.connection()
+        self.version = int(self._meta('version') or 0)
+        self.pending_entries = 0
+
+        rows = conn.execute("SELECT data FROM products ORDER BY seq").fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def _where(self, filters: Dict[str, Optional[str]]) -> Tuple[str, List[str]]:
+        clauses = ["1 = 1"]
+        params = []
+
+        for name, value in filters.items():
+            if value is None:
+                continue
+
+            if name not in SQL_FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+
+            clauses.append(SQL_FILTERS[name])
+            params.append(value)
+
+        return " AND ".join(clauses), params
+
+    def page_products(
+        self,
+        filters: Dict[str, Optional[str]],
+        limit: Optional[int] = None,
+        after: int = -1
+    ) -> Tuple[List[Dict], int, Optional[int]]:
+        """
+        Products matching filters in catalog (seq) order after the given
+        seq, from one read transaction.
+        Returns (page, total matches, seq to resume after if more remain).
+        """
+        conn = self.pool.connection()
+        where, params = self._where(filters)
+
+        conn.execute("BEGIN")
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM products p WHERE {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT p.seq, p.data FROM products p WHERE {where} AND p.seq > ? ORDER BY p.seq LIMIT ?",
+                (*params, after, limit + 1 if limit else -1)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+
+        next_after = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1]['seq']
+
+        return [json.loads(row['data']) for row in rows], total, next_after
+
+    def read_new_entries(self) -> Optional[List[Dict]]:
+        """
+        Changes committed by other workers since our version.
+        Returns None when they have been pruned and a reload is needed.
+        """
+        current = int(self._meta('version') or 0)
+        if current == self.version:
+            return []
+
+        rows = self.pool.connection().execute(
+            "SELECT version, entry FROM catalog_changes WHERE version > ? ORDER BY version",
+            (self.version,)
+        ).fetchall()
+
+        if not rows or rows[0]['version'] != self.version + 1:
+            return None
+
+        self.version = rows[-1]['version']
+        return [json.loads(row['entry']) for row in rows]
+
+    def append(self, entries: List[Dict]) -> int:
+        """Apply entries to the tables and the change feed; caller holds locked()"""
+        conn = self.pool.connection()
+        next_seq = conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM products").fetchone()[0]
+        version = self.version
+
+        for entry in entries:
+            op = entry.get('op')
+
+            if op == 'add':
+                if self._get(entry['product']['product_id']) is None:
+                    self._insert(entry['product'], next_seq)
+                    next_seq += 1
+
+            elif op == 'update':
+                row = self._get(entry['product_id'])
+                if row is not None:
+                    product = {**json.loads(row['data']), **entry['updates']}
+                    self._delete(entry['product_id'])
+                    self._insert(product, row['seq'])
+
+            elif op == 'delete':
+                self._delete(entry['product_id'])
+
+            version += 1
+            conn.execute(
+                "INSERT INTO catalog_changes (version, entry) VALUES (?, ?)",
+                (version, json.dumps({'v': version, **entry}, separators=(',', ':')))
+            )
+
+        self._set_meta('version', version)
+        self.version = version
+        self.pending_entries += len(entries)
+        return version
+
+    def needs_compaction(self, catalog_size: int = 0) -> bool:
+        return self.pending_entries >= self.compact_every
+
+    def compact(self, products: List[Dict]):
+        """The tables are always current; just trim the change feed"""
+        self.pool.connection().execute(
+            "DELETE FROM catalog_changes WHERE version <= ?",
+            (self.version - self.compact_every,)
+        )
+        self.pending_entries = 0
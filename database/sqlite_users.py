@@ -0,0 +1,183 @@
+import json
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from database.sqlite import SqliteConnectionPool
+from database.profile_codec import decode_profile, pack_frame
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    last_active TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    recorded_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_history_user ON user_history(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_user_history_time ON user_history(user_id, recorded_at);
+
+CREATE TABLE IF NOT EXISTS user_favorites (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    recorded_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_favorites_user ON user_favorites(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_user_favorites_time ON user_favorites(user_id, recorded_at);
+"""
+
+# Log name -> (table, record field holding its timestamp)
+LOG_TABLES = {
+    'history': ('user_history', 'timestamp'),
+    'favorites': ('user_favorites', 'saved_at'),
+}
+
+class SqliteUserStore:
+    """
+    SQLite storage backend for UserDatabase, a drop-in for
+    FileUserStore. Profile headers live in one table and each cold log
+    in an indexed table, so millions of users don't mean millions of
+    files. batch() groups writes into a single transaction; UserDatabase
+    uses it to commit a whole flush at once. Values are stored as
+    compact JSON or, with format="msgpack", as binary frames; either is
+    readable.
+    """
+
+    def __init__(self, database_url: str, format: str = 'json'):
+        self.pool = SqliteConnectionPool(database_url)
+        self.binary = format == 'msgpack'
+        self._local = threading.local()
+
+        self.pool.connection().executescript(SCHEMA)
+
+    # A failed batch is rolled back as a whole
+    transactional = True
+
+    @contextmanager
+    def batch(self):
+        """One transaction for everything written inside; nests"""
+        conn = self.pool.connection()
+        depth = getattr(self._local, 'depth', 0)
+
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = depth + 1
+
+        try:
+            yield
+        except BaseException:
+            self._local.depth = depth
+            if depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        else:
+            self._local.depth = depth
+            if depth == 0:
+                conn.execute("COMMIT")
+
+    def locked(self, user_id: str):
+        """Serialize a user's read-modify-write across workers (a write transaction)"""
+        return self.batch()
+
+    def _encode(self, obj: Dict):
+        if self.binary:
+            return pack_frame(obj)
+        return json.dumps(obj, separators=(',', ':'))
+
+    def user_ids(self) -> Iterator[str]:
+        for row in self.pool.connection().execute("SELECT user_id FROM users"):
+            yield row['user_id']
+
+    def read_profile(self, user_id: str) -> Optional[Dict]:
+        row = self.pool.connection().execute(
+            "SELECT data FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return decode_profile(row['data']) if row else None
+
+    def write_profile(self, user_profile: Dict):
+        self.pool.connection().execute(
+            "INSERT OR REPLACE INTO users (user_id, last_active, data) VALUES (?, ?, ?)",
+            (
+                user_profile['user_id'],
+                user_profile.get('last_active'),
+                self._encode(user_profile)
+            )
+        )
+
+    def append_log(self, user_id: str, log: str, records: List[Dict]):
+        table, time_field = LOG_TABLES[log]
+        self.pool.connection().executemany(
+            f"INSERT INTO {table} (user_id, recorded_at, data) VALUES (?, ?, ?)",
+            [
+                (user_id, record.get(time_field), self._encode(record))
+                for record in records
+            ]
+        )
+
+    def read_log(self, user_id: str, log: str) -> List[Dict]:
+        table, _ = LOG_TABLES[log]
+        rows = self.pool.connection().execute(
+            f"SELECT data FROM {table} WHERE user_id = ? ORDER BY id", (user_id,)
+        ).fetchall()
+        return [decode_profile(row['data']) for row in rows]
+
+    def iter_log(
+        self,
+        user_id: str,
+        log: str,
+        after: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        batch_size: int = 500
+    ) -> Iterator[Tuple[int, Dict]]:
+        """Stream (row id, record) in append order, batch_size rows at a time"""
+        table, _ = LOG_TABLES[log]
+        clauses = ["user_id = ?", "id > ?"]
+        filters = []
+
+        if since:
+            clauses.append("recorded_at >= ?")
+            filters.append(since)
+        if until:
+            clauses.append("recorded_at < ?")
+            filters.append(until)
+
+        query = f"SELECT id, data FROM {table} WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?"
+        last_id = after or 0
+
+        while True:
+            # Fetch per batch: a streaming response may resume on another thread
+            rows = self.pool.connection().execute(
+                query, (user_id, last_id, *filters, batch_size)
+            ).fetchall()
+
+            for row in rows:
+                yield row['id'], decode_profile(row['data'])
+
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]['id']
+
+    def compact_log(self, user_id: str, log: str, retention: int):
+        """Drop all but the newest retention records"""
+        table, _ = LOG_TABLES[log]
+        self.pool.connection().execute(
+            f"DELETE FROM {table} WHERE user_id = ? AND id <= ("
+            f"SELECT id FROM {table} WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (user_id, user_id, retention)
+        )
+
+    def delete_user(self, user_id: str, logs: List[str]) -> bool:
+        with self.batch():
+            conn = self.pool.connection()
+            for log in logs:
+                table, _ = LOG_TABLES[log]
+                conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+            cursor = conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            return cursor.rowcount > 0
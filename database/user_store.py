@@ -0,0 +1,214 @@
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from database.profile_codec import decode_profile, encode_profile, encode_records, read_frames, read_json_lines
+from utils.sharding import iter_sharded, sharded_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process writers only
+    fcntl = None
+
+# Log name -> record field holding its timestamp
+LOG_TIME_FIELDS = {
+    'history': 'timestamp',
+    'favorites': 'saved_at',
+}
+
+def in_time_range(record: Dict, time_field: str, since: Optional[str], until: Optional[str]) -> bool:
+    """since is inclusive, until exclusive; ISO timestamps compare as strings"""
+    timestamp = record.get(time_field) or ''
+    if since and timestamp < since:
+        return False
+    if until and timestamp >= until:
+        return False
+    return True
+
+# Cross-process user locks are striped over this many lock files
+LOCK_STRIPES = 64
+
+# Format -> (profile suffix, log suffix)
+FILE_SUFFIXES = {
+    'json': ('.json', '.jsonl'),
+    'msgpack': ('.bin', '.bin'),
+}
+
+class FileUserStore:
+    """
+    One header file per user with append-only <user_id>.<log> logs next
+    to it, in the user's hash-sharded subdirectory. This is the default
+    UserDatabase backend; SqliteUserStore has the same interface.
+
+    Files are written in the configured format - pretty JSON / JSON
+    lines, or framed MessagePack (see profile_codec) with optionally
+    compressed log frames - and read in either, so a tree can switch
+    formats without a migration: each profile is rewritten in the new
+    format on its next save and each log on its next compaction.
+    """
+
+    def __init__(
+        self,
+        users_dir: Path,
+        compact_bytes: int = 0,
+        format: str = 'json',
+        compress_logs: bool = False
+    ):
+        self.users_dir = users_dir
+        self.users_dir.mkdir(exist_ok=True)
+        self.compact_bytes = compact_bytes
+        self.binary = format == 'msgpack'
+        self.compress_logs = compress_logs
+        self.format = 'msgpack' if self.binary else 'json'
+        self.other_format = 'json' if self.binary else 'msgpack'
+        self.locks_dir = users_dir / '.locks'
+        self._local = threading.local()
+
+    def _get_user_file(self, user_id: str, format: str, create: bool = False) -> Path:
+        suffix, _ = FILE_SUFFIXES[format]
+        return sharded_path(self.users_dir, f"{user_id}{suffix}", create)
+
+    def _get_log_file(self, user_id: str, log: str, format: str, create: bool = False) -> Path:
+        _, suffix = FILE_SUFFIXES[format]
+        return sharded_path(self.users_dir, f"{user_id}.{log}{suffix}", create)
+
+    # Files are written one by one: a failed batch keeps what it wrote
+    transactional = False
+
+    @contextmanager
+    def batch(self):
+        """Files are written one by one; there is nothing to group"""
+        yield
+
+    @contextmanager
+    def locked(self, user_id: str):
+        """Serialize a user's read-modify-write across worker processes; nests"""
+        stripe = zlib.crc32(user_id.encode()) % LOCK_STRIPES
+        held = self._local.__dict__.setdefault('held', set())
+
+        if fcntl is None or stripe in held:
+            yield
+            return
+
+        self.locks_dir.mkdir(exist_ok=True)
+        with open(self.locks_dir / f"{stripe}.lock", 'a') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            held.add(stripe)
+            try:
+                yield
+            finally:
+                held.discard(stripe)
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def user_ids(self) -> Iterator[str]:
+        seen = set()
+
+        for profile_suffix, _ in FILE_SUFFIXES.values():
+            for user_file in iter_sharded(self.users_dir, f"*{profile_suffix}"):
+                # Logs share the .bin suffix but carry an extra dot
+                user_id = user_file.name[:-len(profile_suffix)]
+                if '.' not in user_id and user_id not in seen:
+                    seen.add(user_id)
+                    yield user_id
+
+    def read_profile(self, user_id: str) -> Optional[Dict]:
+        for format in (self.format, self.other_format):
+            user_file = self._get_user_file(user_id, format)
+            if user_file.exists():
+                return decode_profile(user_file.read_bytes())
+
+        return None
+
+    def write_profile(self, user_profile: Dict):
+        user_id = user_profile['user_id']
+        data = encode_profile(user_profile, self.binary)
+
+        user_file = self._get_user_file(user_id, self.format, create=True)
+        with open(user_file, 'wb' if self.binary else 'w') as f:
+            f.write(data)
+
+        # Migrated on save
+        self._get_user_file(user_id, self.other_format).unlink(missing_ok=True)
+
+    def append_log(self, user_id: str, log: str, records: List[Dict]):
+        data = encode_records(records, self.binary, self.compress_logs)
+
+        with open(self._get_log_file(user_id, log, self.format, create=True), 'ab' if self.binary else 'a') as f:
+            f.write(data)
+
+    def _read_log_file(self, log_file: Path, binary: bool) -> Iterator[Dict]:
+        if binary:
+            with open(log_file, 'rb') as f:
+                for records in read_frames(f):
+                    yield from records
+        else:
+            with open(log_file, 'r') as f:
+                yield from read_json_lines(f)
+
+    def iter_log(
+        self,
+        user_id: str,
+        log: str,
+        after: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None
+    ) -> Iterator[Tuple[int, Dict]]:
+        """
+        Stream (key, record) in append order without loading the log.
+        The key is the record's 'seq' stamp, so it survives compaction.
+        Records appended before stamping get their position in the log,
+        which is stable until the first compaction persists it.
+        """
+        time_field = LOG_TIME_FIELDS[log]
+        ordinal = 0
+
+        # Records in the other format predate the switch, so come first
+        for format in (self.other_format, self.format):
+            log_file = self._get_log_file(user_id, log, format)
+            if not log_file.exists():
+                continue
+
+            for record in self._read_log_file(log_file, format == 'msgpack'):
+                ordinal += 1
+                key = record.setdefault('seq', ordinal)
+
+                if after is not None and key <= after:
+                    continue
+                if in_time_range(record, time_field, since, until):
+                    yield key, record
+
+    def read_log(self, user_id: str, log: str) -> List[Dict]:
+        return [record for _, record in self.iter_log(user_id, log)]
+
+    def compact_log(self, user_id: str, log: str, retention: int):
+        """Keep the newest retention records once the log outgrows compact_bytes"""
+        log_file = self._get_log_file(user_id, log, self.format)
+        other_file = self._get_log_file(user_id, log, self.other_format)
+
+        size = sum(f.stat().st_size for f in (log_file, other_file) if f.exists())
+        if not size or size < self.compact_bytes:
+            return
+
+        # Every record read carries its seq, so cursor keys survive the trim
+        recent = self.read_log(user_id, log)[-retention:]
+
+        tmp_file = log_file.with_name(f".{log_file.name}.tmp")
+        with open(tmp_file, 'wb' if self.binary else 'w') as f:
+            f.write(encode_records(recent, self.binary, self.compress_logs))
+        tmp_file.replace(log_file)
+        other_file.unlink(missing_ok=True)
+
+    def delete_user(self, user_id: str, logs: List[str]) -> bool:
+        deleted = False
+
+        for format in FILE_SUFFIXES:
+            for log in logs:
+                self._get_log_file(user_id, log, format).unlink(missing_ok=True)
+
+            user_file = self._get_user_file(user_id, format)
+            if user_file.exists():
+                user_file.unlink()
+                deleted = True
+
+        return deleted
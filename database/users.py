@@ -1,16 +1,249 @@
-import json
-from pathlib import Path
-from typing import Dict, Optional
+import copy
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from datetime import datetime
 from config import settings
+from utils.preferences import empty_preferences, normalize_preferences
+from database.user_store import FileUserStore
+from database.sqlite_users import SqliteUserStore
+
+# Cold, append-only per-user logs -> header counter tracking their length
+COLD_LOGS = {
+    'history': 'interaction_count',
+    'favorites': 'favorites_count',
+}
+
+# Legacy embedded profile fields -> the log that replaced them
+LEGACY_LOG_FIELDS = {
+    'interaction_history': 'history',
+    'saved_favorites': 'favorites',
+}
+
+# Per-user transaction locks are striped so they stay bounded
+USER_LOCK_STRIPES = 64
 
 class UserDatabase:
+    """
+    User profiles (hot header documents plus append-only history/favorites
+    logs) behind a bounded LRU cache; see USER_WRITE_MODE for durability.
+    """
+    
     def __init__(self):
-        self.users_dir = settings.USER_DATA_DIR
-        self.users_dir.mkdir(exist_ok=True)
+        self.storage = self._create_storage()
+        self.cache_size = settings.USER_CACHE_SIZE
+        self.write_back = settings.USER_WRITE_MODE == "write_back"
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._dirty: Set[str] = set()
+        # Dirty profiles pushed out of the LRU, kept until the flush writes them
+        self._evicted: Dict[str, Dict] = {}
+        # user_id -> log name -> records not yet appended (write_back mode)
+        self._pending_logs: Dict[str, Dict[str, List[Dict]]] = {}
+        self._history_appended: Set[str] = set()
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._flush_wanted = threading.Event()
+        self._user_locks = [threading.RLock() for _ in range(USER_LOCK_STRIPES)]
+        
+        if self.write_back:
+            atexit.register(self.flush)
+        
+        if self.write_back or settings.USER_FLUSH_INTERVAL > 0:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+    
+    def _create_storage(self):
+        if settings.USER_STORAGE == "sqlite":
+            return SqliteUserStore(settings.DATABASE_URL, format=settings.USER_PROFILE_FORMAT)
+        
+        return FileUserStore(
+            settings.USER_DATA_DIR,
+            compact_bytes=settings.USER_HISTORY_COMPACT_BYTES,
+            format=settings.USER_PROFILE_FORMAT,
+            compress_logs=settings.USER_HISTORY_COMPRESS
+        )
+    
+    def _user_lock(self, user_id: str) -> threading.RLock:
+        return self._user_locks[hash(user_id) % USER_LOCK_STRIPES]
+    
+    def _cache_put(self, user_profile: Dict):
+        """Insert or refresh a cached profile, evicting the LRU one; caller holds the lock"""
+        user_id = user_profile['user_id']
+        self._cache[user_id] = user_profile
+        self._cache.move_to_end(user_id)
+        
+        while len(self._cache) > self.cache_size:
+            evicted_id, evicted = self._cache.popitem(last=False)
+            if evicted_id in self._dirty:
+                # Written by the flush thread, which this wakes
+                self._evicted[evicted_id] = evicted
+                self._flush_wanted.set()
+    
+    def _mark_dirty(self, user_profile: Dict):
+        with self._lock:
+            if self.write_back:
+                self._cache_put(user_profile)
+                self._dirty.add(user_profile['user_id'])
+            else:
+                # On failure the caller's apply() fails, so its records go too
+                self._persist(user_profile, self._pending_logs.pop(user_profile['user_id'], {}))
+    
+    @contextmanager
+    def _shared_lock(self, user_id: str):
+        """
+        In write_through mode, lock user_id against other workers'
+        read-modify-writes. Taken after self._lock, like every other
+        storage access made under it.
+        """
+        if self.write_back:
+            yield
+            return
+        
+        with self._lock, self.storage.locked(user_id):
+            yield
+    
+    def _persist(self, user_profile: Dict, pending: Dict[str, List[Dict]]):
+        """Append a user's buffered log records, then write the profile header"""
+        with self.storage.batch():
+            for log, records in pending.items():
+                self._append_log_records(user_profile['user_id'], log, records)
+            
+            self._write_user(user_profile)
+    
+    def flush(self, user_ids: Optional[Iterable[str]] = None):
+        """
+        Write dirty profiles (all, or those in user_ids) with their
+        buffered log records in one batch. Copies are taken under the
+        cache lock and written outside it, so requests never wait for
+        the disk. A user whose write fails stays dirty and keeps its
+        records buffered for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                selected = self._dirty if user_ids is None else self._dirty.intersection(user_ids)
+                batch = []
+                for user_id in selected:
+                    user_profile = self._cache.get(user_id) or self._evicted[user_id]
+                    pending = self._pending_logs.get(user_id, {})
+                    batch.append((
+                        user_profile,
+                        copy.deepcopy(user_profile),
+                        {log: list(records) for log, records in pending.items()}
+                    ))
+            
+            if not batch:
+                return
+            
+            written = []
+            try:
+                with self.storage.batch():
+                    for entry in batch:
+                        _, user_profile, pending = entry
+                        with self.storage.locked(user_profile['user_id']):
+                            self._persist(user_profile, pending)
+                        written.append(entry)
+            except BaseException:
+                # A rolled-back transaction wrote nothing; plain files keep what was written
+                if not self.storage.transactional:
+                    self._release(written)
+                raise
+            
+            self._release(batch)
     
-    def _get_user_file(self, user_id: str) -> Path:
-        return self.users_dir / f"{user_id}.json"
+    def _release(self, written: List[Tuple[Dict, Dict, Dict[str, List[Dict]]]]):
+        """Forget buffered state the flush has written"""
+        with self._lock:
+            for user_profile, _, pending in written:
+                user_id = user_profile['user_id']
+                
+                buffered = self._pending_logs.get(user_id, {})
+                for log, records in pending.items():
+                    # Records buffered since the copy was taken stay queued
+                    queued = buffered.get(log, [])
+                    del queued[:len(records)]
+                    if not queued:
+                        buffered.pop(log, None)
+                if not buffered:
+                    self._pending_logs.pop(user_id, None)
+                
+                # Still dirty if it was updated since the copy was taken
+                if self._evicted.get(user_id) is user_profile:
+                    del self._evicted[user_id]
+                    self._dirty.discard(user_id)
+                elif self._cache.get(user_id) is user_profile:
+                    self._dirty.discard(user_id)
+    
+    def _flush_loop(self):
+        interval = settings.USER_FLUSH_INTERVAL
+        
+        while True:
+            # Evictions wake the loop early
+            self._flush_wanted.wait(interval if interval > 0 else None)
+            self._flush_wanted.clear()
+            try:
+                self.flush()
+                self.compact_histories()
+            except Exception as e:
+                print(f"User profile flush error: {str(e)}")
+    
+    def _append_log_records(self, user_id: str, log: str, records: List[Dict]):
+        self.storage.append_log(user_id, log, records)
+        
+        if log == 'history':
+            self._history_appended.add(user_id)
+    
+    def _append_log(self, user_profile: Dict, log: str, record: Dict):
+        """Record a cold log entry and bump its header counter; caller holds the lock"""
+        user_id = user_profile['user_id']
+        
+        counter = COLD_LOGS[log]
+        user_profile[counter] = user_profile.get(counter, 0) + 1
+        
+        # Stable position for cursors, unaffected by compaction
+        record['seq'] = user_profile[counter]
+        self._pending_logs.setdefault(user_id, {}).setdefault(log, []).append(record)
+    
+    def _read_log(self, user_id: str, log: str) -> List[Dict]:
+        # Not mid-flush, when records are both written and still buffered
+        with self._flush_lock, self._lock:
+            pending = self._pending_logs.get(user_id, {}).get(log, [])
+            return self.storage.read_log(user_id, log) + pending
+    
+    def iter_log(
+        self,
+        user_id: str,
+        log: str,
+        after: Optional[int] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None
+    ) -> Iterator[Tuple[int, Dict]]:
+        """
+        Stream (cursor key, record) pairs of a cold log straight from
+        storage, resuming after the given key and filtered to the
+        [since, until) time range. Memory stays bounded by the store's
+        read batch, however long the log is.
+        """
+        if self._pending_logs.get(user_id):
+            # Persist buffered records first so every record has a durable key
+            self.flush([user_id])
+        
+        return self.storage.iter_log(user_id, log, after, since, until)
+    
+    def compact_histories(self):
+        """Trim oversized interaction logs to the most recent entries"""
+        retention = settings.USER_HISTORY_RETENTION
+        
+        with self._lock:
+            candidates, self._history_appended = self._history_appended, set()
+        
+        if retention <= 0:
+            return
+        
+        for user_id in candidates:
+            with self._user_lock(user_id), self.storage.locked(user_id):
+                self.storage.compact_log(user_id, 'history', retention)
     
     def create_user_profile(self, user_id: str, detected_info: Dict) -> Dict:
         user_profile = {
@@ -18,73 +251,161 @@ class UserDatabase:
             'created_at': datetime.now().isoformat(),
             'last_active': datetime.now().isoformat(),
             'detected_profile': detected_info,
-            'preferences': {
-                'styles': {},
-                'colors': {}
-            },
-            'interaction_history': [],
-            'total_tryons': 0,
-            'saved_favorites': []
+            'preferences': empty_preferences(),
+            'interaction_count': 0,
+            'favorites_count': 0,
+            'total_tryons': 0
         }
         
         self._save_user(user_profile)
         return user_profile
     
-    def get_user_profile(self, user_id: str) -> Optional[Dict]:
-        user_file = self._get_user_file(user_id)
+    def get_user_profile(self, user_id: str, cache: bool = True) -> Optional[Dict]:
+        """
+        Cached profile, loaded on a miss. cache=False leaves the LRU
+        untouched for bulk read-only scans; the result must not be
+        modified.
+        """
+        if not self.write_back:
+            return self._read_shared(user_id, migrate=cache)
+        
+        with self._lock:
+            user_profile = self._cache.get(user_id)
+            if user_profile is not None:
+                if cache:
+                    self._cache.move_to_end(user_id)
+                return user_profile
+            
+            # Evicted, but storage doesn't have this version yet
+            user_profile = self._evicted.get(user_id)
+            if user_profile is not None:
+                if cache:
+                    del self._evicted[user_id]
+                    self._cache_put(user_profile)
+                return user_profile
         
-        if user_file.exists():
-            with open(user_file, 'r') as f:
-                return json.load(f)
+        user_profile = self.storage.read_profile(user_id)
+        
+        if user_profile is not None and not cache:
+            return user_profile
+        
+        if user_profile is not None:
+            with self._lock:
+                # Another thread may have loaded (and modified) it meanwhile
+                if user_id in self._cache:
+                    return self._cache[user_id]
+                
+                if any(field in user_profile for field in LEGACY_LOG_FIELDS):
+                    self._migrate_legacy_logs(user_profile)
+                
+                self._cache_put(user_profile)
+            
+            return user_profile
         
         return None
     
-    def update_user_profile(self, user_id: str, updates: Dict) -> bool:
-        user_profile = self.get_user_profile(user_id)
+    def _read_shared(self, user_id: str, migrate: bool = True) -> Optional[Dict]:
+        """Profile as other workers last wrote it (write_through mode)"""
+        user_profile = self.storage.read_profile(user_id)
         
-        if not user_profile:
-            return False
+        if migrate and user_profile is not None and any(field in user_profile for field in LEGACY_LOG_FIELDS):
+            with self._shared_lock(user_id):
+                # Re-read: another worker may have migrated it first
+                user_profile = self.storage.read_profile(user_id)
+                if user_profile is not None and any(field in user_profile for field in LEGACY_LOG_FIELDS):
+                    self._migrate_legacy_logs(user_profile)
         
-        user_profile.update(updates)
-        user_profile['last_active'] = datetime.now().isoformat()
+        return user_profile
+    
+    def _migrate_legacy_logs(self, user_profile: Dict):
+        """Move embedded history/favorites lists out of a legacy profile into logs"""
+        with self.storage.batch():
+            for field, log in LEGACY_LOG_FIELDS.items():
+                if field not in user_profile:
+                    continue
+                
+                records = user_profile.pop(field) or []
+                count = max(user_profile.get(COLD_LOGS[log], 0), len(records))
+                user_profile[COLD_LOGS[log]] = count
+                
+                # Stamp seq like _append_log, ending at the header counter
+                for position, record in enumerate(records, count - len(records) + 1):
+                    record['seq'] = position
+                
+                if records:
+                    self._append_log_records(user_profile['user_id'], log, records)
+            
+            self._write_user(user_profile)
+    
+    def apply(
+        self,
+        user_id: str,
+        mutator: Optional[Callable[[Dict], None]] = None,
+        logs: Optional[Dict[str, List[Dict]]] = None
+    ) -> Optional[Dict]:
+        """
+        Atomically update a profile: mutator edits a copy in place and
+        logs maps a cold log name to records to append with it. Nothing
+        is published if the mutator raises. Returns the updated profile,
+        or None if the user does not exist.
+        """
+        with self._user_lock(user_id), self._shared_lock(user_id):
+            user_profile = self.get_user_profile(user_id)
+            
+            if not user_profile:
+                return None
+            
+            updated = copy.deepcopy(user_profile)
+            if mutator is not None:
+                mutator(updated)
+            
+            with self._lock:
+                for log, records in (logs or {}).items():
+                    for record in records:
+                        self._append_log(updated, log, record)
+                
+                self._save_user(updated)
+            
+            return updated
+    
+    def update_user_profile(self, user_id: str, updates: Dict) -> bool:
+        def mutate(user_profile: Dict):
+            user_profile.update(updates)
+            user_profile['last_active'] = datetime.now().isoformat()
         
-        self._save_user(user_profile)
-        return True
+        return self.apply(user_id, mutate) is not None
     
     def _save_user(self, user_profile: Dict):
-        user_file = self._get_user_file(user_profile['user_id'])
-        with open(user_file, 'w') as f:
-            json.dump(user_profile, f, indent=2)
+        self._mark_dirty(user_profile)
     
-    def add_interaction(self, user_id: str, interaction: Dict) -> bool:
-        user_profile = self.get_user_profile(user_id)
-        
-        if not user_profile:
-            return False
-        
+    def _write_user(self, user_profile: Dict):
+        self.storage.write_profile(user_profile)
+    
+    def add_interaction(
+        self,
+        user_id: str,
+        interaction: Dict,
+        mutator: Optional[Callable[[Dict], None]] = None
+    ) -> Optional[Dict]:
+        """
+        Log an interaction; mutator (e.g. a preference update) runs in
+        the same transaction. Returns the updated profile or None.
+        """
         interaction['timestamp'] = datetime.now().isoformat()
-        user_profile['interaction_history'].append(interaction)
         
-        if interaction.get('action') == 'tried_on':
-            user_profile['total_tryons'] = user_profile.get('total_tryons', 0) + 1
+        def mutate(user_profile: Dict):
+            if interaction.get('action') == 'tried_on':
+                user_profile['total_tryons'] = user_profile.get('total_tryons', 0) + 1
+            
+            if mutator is not None:
+                mutator(user_profile)
         
-        self._save_user(user_profile)
-        return True
+        return self.apply(user_id, mutate, logs={'history': [interaction]})
     
     def add_favorite(self, user_id: str, favorite: Dict) -> bool:
-        user_profile = self.get_user_profile(user_id)
-        
-        if not user_profile:
-            return False
-        
-        if 'saved_favorites' not in user_profile:
-            user_profile['saved_favorites'] = []
-        
         favorite['saved_at'] = datetime.now().isoformat()
-        user_profile['saved_favorites'].append(favorite)
         
-        self._save_user(user_profile)
-        return True
+        return self.apply(user_id, logs={'favorites': [favorite]}) is not None
     
     def get_user_favorites(self, user_id: str) -> list:
         user_profile = self.get_user_profile(user_id)
@@ -92,7 +413,7 @@ class UserDatabase:
         if not user_profile:
             return []
         
-        return user_profile.get('saved_favorites', [])
+        return self._read_log(user_id, 'favorites')
     
     def get_user_history(self, user_id: str) -> list:
         user_profile = self.get_user_profile(user_id)
@@ -100,29 +421,26 @@ class UserDatabase:
         if not user_profile:
             return []
         
-        return user_profile.get('interaction_history', [])
+        return self._read_log(user_id, 'history')
     
     def update_preferences(self, user_id: str, preferences: Dict) -> bool:
-        user_profile = self.get_user_profile(user_id)
-        
-        if not user_profile:
-            return False
-        
-        if 'preferences' not in user_profile:
-            user_profile['preferences'] = {'styles': {}, 'colors': {}}
+        def mutate(user_profile: Dict):
+            user_profile['preferences'] = normalize_preferences({
+                **user_profile.get('preferences', {}),
+                **preferences
+            })
         
-        user_profile['preferences'].update(preferences)
-        
-        self._save_user(user_profile)
-        return True
+        return self.apply(user_id, mutate) is not None
     
     def delete_user(self, user_id: str) -> bool:
-        user_file = self._get_user_file(user_id)
-        
-        if user_file.exists():
-            user_file.unlink()
-            return True
+        with self._flush_lock, self._lock:
+            cached = self._cache.pop(user_id, None) or self._evicted.pop(user_id, None)
+            self._dirty.discard(user_id)
+            self._pending_logs.pop(user_id, None)
+            
+            deleted = self.storage.delete_user(user_id, list(COLD_LOGS))
         
-        return False
+        # A cached profile that was never flushed counts as deleted too
+        return deleted or cached is not None
 
 user_db = UserDatabase()
\ No newline at end of file
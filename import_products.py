@@ -0,0 +1,50 @@
+"""
+Import Products - Bulk-loads an NDJSON product feed into the catalog
+Each line is one product record with the same fields as products.json
+"""
+
+import argparse
+import sys
+import time
+from database.products import product_db
+
+def import_products(feed_path, batch_size=None):
+    """Stream the feed into the catalog, printing progress per batch"""
+    
+    start_time = time.time()
+    stats = None
+    
+    with open(feed_path, 'rb') as feed:
+        for stats in product_db.import_products(feed, batch_size):
+            elapsed = time.time() - start_time
+            rate = stats['processed'] / elapsed if elapsed else 0
+            print(
+                f"⏳ Processed: {stats['processed']:,}  "
+                f"Imported: {stats['imported']:,}  "
+                f"Duplicates: {stats['duplicates']:,}  "
+                f"Invalid: {stats['invalid']:,}  "
+                f"({rate:,.0f} records/s)"
+            )
+    
+    for error in stats['errors']:
+        print(f"❌ Line {error['line']}: {error['error']}")
+    
+    print(f"\n🎉 Done in {time.time() - start_time:.1f}s!")
+    print(f"   Imported: {stats['imported']:,} products")
+    print(f"   Catalog size: {len(product_db.snapshot):,} products (version {product_db.version})")
+    
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import products from an NDJSON feed")
+    parser.add_argument("feed", help="Path to the NDJSON feed (one product per line)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Records per persisted batch")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("📦 SmartFit AI - Bulk Product Import")
+    print("=" * 60)
+    print()
+    
+    stats = import_products(args.feed, args.batch_size)
+    sys.exit(1 if stats['invalid'] else 0)
@@ -37,7 +37,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static directories
+# Mount static directories (uploads/ and outputs/ are hash-sharded, see utils/sharding.py)
 app.mount("/uploads", StaticFiles(directory=str(settings.UPLOADS_DIR)), name="uploads")
 app.mount("/products", StaticFiles(directory=str(settings.PRODUCTS_DIR)), name="products")
 app.mount("/outputs", StaticFiles(directory=str(settings.OUTPUTS_DIR)), name="outputs")
@@ -0,0 +1,73 @@
+"""
+Migrate Storage Layout - Moves files in uploads/, outputs/ and user_data/
+into the hash-sharded layout set by STORAGE_SHARD_DEPTH
+Works from a flat tree or from any previous depth; safe to re-run
+"""
+
+import argparse
+import os
+import sys
+import time
+from config import settings
+from utils.sharding import sharded_path
+
+def is_hidden(path, base_dir):
+    """Dotfiles and anything under a dot-directory (e.g. user_data/.locks) stay put"""
+    return any(part.startswith('.') for part in path.relative_to(base_dir).parts)
+
+def migrate_directory(base_dir, dry_run=False):
+    """Move every file under base_dir to its shard; returns (moved, already in place)"""
+    
+    moved = 0
+    in_place = 0
+    
+    # Materialize first: files are moved while we walk
+    files = [
+        path for path in base_dir.rglob("*")
+        if path.is_file() and not is_hidden(path, base_dir)
+    ]
+    
+    for path in files:
+        target = sharded_path(base_dir, path.name)
+        
+        if target == path:
+            in_place += 1
+            continue
+        
+        if not dry_run:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, target)
+        moved += 1
+    
+    if not dry_run:
+        # Drop shard directories left empty by a depth change, deepest first
+        directories = sorted(
+            (path for path in base_dir.rglob("*") if path.is_dir() and not is_hidden(path, base_dir)),
+            key=lambda path: len(path.parts),
+            reverse=True
+        )
+        for directory in directories:
+            if not any(directory.iterdir()):
+                directory.rmdir()
+    
+    return moved, in_place
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move stored files into the sharded directory layout")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would move")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print(f"🗂️  SmartFit AI - Storage Layout Migration (depth {settings.STORAGE_SHARD_DEPTH})")
+    print("=" * 60)
+    print()
+    
+    start_time = time.time()
+    
+    for base_dir in (settings.UPLOADS_DIR, settings.OUTPUTS_DIR, settings.USER_DATA_DIR):
+        moved, in_place = migrate_directory(base_dir, args.dry_run)
+        action = "Would move" if args.dry_run else "Moved"
+        print(f"✅ {base_dir.name}/: {action} {moved:,} files ({in_place:,} already in place)")
+    
+    print(f"\n🎉 Done in {time.time() - start_time:.1f}s!")
+    sys.exit(0)
@@ -0,0 +1,80 @@
+"""
+Migrate Users - Copies file-based user profiles from user_data/ into SQLite
+Run once before switching USER_STORAGE to "sqlite"; safe to re-run
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from config import settings
+from database.user_store import FileUserStore
+from database.sqlite_users import SqliteUserStore
+from database.users import COLD_LOGS, LEGACY_LOG_FIELDS
+
+def migrate_users(users_dir, database_url, batch_size=1000):
+    """Copy every profile and its logs, committing batch_size users at a time"""
+    
+    source = FileUserStore(users_dir)
+    target = SqliteUserStore(database_url, format=settings.USER_PROFILE_FORMAT)
+    start_time = time.time()
+    migrated = 0
+    failed = []
+    
+    user_ids = iter(source.user_ids())
+    
+    while True:
+        batch = [user_id for _, user_id in zip(range(batch_size), user_ids)]
+        if not batch:
+            break
+        
+        with target.batch():
+            for user_id in batch:
+                try:
+                    user_profile = source.read_profile(user_id)
+                except ValueError as e:
+                    failed.append((user_id, str(e)))
+                    continue
+                
+                logs = {log: source.read_log(user_id, log) for log in COLD_LOGS}
+                
+                # Profiles saved before the logs existed embed them
+                for field, log in LEGACY_LOG_FIELDS.items():
+                    if field in user_profile:
+                        logs[log] = (user_profile.pop(field) or []) + logs[log]
+                        user_profile.setdefault(COLD_LOGS[log], len(logs[log]))
+                
+                # Replace rather than append so re-runs don't duplicate logs
+                target.delete_user(user_id, list(COLD_LOGS))
+                for log, records in logs.items():
+                    if records:
+                        target.append_log(user_id, log, records)
+                target.write_profile(user_profile)
+                migrated += 1
+        
+        elapsed = time.time() - start_time
+        print(f"⏳ Migrated: {migrated:,} users ({migrated / elapsed if elapsed else 0:,.0f} users/s)")
+    
+    for user_id, error in failed:
+        print(f"❌ {user_id}: {error}")
+    
+    print(f"\n🎉 Done in {time.time() - start_time:.1f}s!")
+    print(f"   Migrated: {migrated:,} users into {database_url}")
+    print(f"   Set USER_STORAGE=sqlite to use them")
+    
+    return migrated, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate file-based user profiles into SQLite")
+    parser.add_argument("--users-dir", default=str(settings.USER_DATA_DIR), help="Directory of profile files")
+    parser.add_argument("--database-url", default=settings.DATABASE_URL, help="Target sqlite:/// URL")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Users per committed transaction")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("👤 SmartFit AI - User Profile Migration")
+    print("=" * 60)
+    print()
+    
+    migrated, failed = migrate_users(Path(args.users_dir), args.database_url, args.batch_size)
+    sys.exit(1 if failed else 0)
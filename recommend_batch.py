@@ -0,0 +1,78 @@
+"""
+Recommend Batch - Scores recommendations for many users offline
+Reads photo ids (one per line, or as arguments) and writes one NDJSON
+result line per user, in input order
+"""
+
+import argparse
+import json
+import sys
+import time
+from database.factors import factor_store
+from database.products import product_db
+from database.users import user_db
+from utils.recommendation import RecommendationEngine
+
+def read_photo_ids(path):
+    """Photo ids from a file, or stdin for '-', skipping blank lines"""
+    source = sys.stdin if path == '-' else open(path)
+    
+    with source:
+        for line in source:
+            photo_id = line.strip()
+            if photo_id:
+                yield photo_id
+
+def recommend_batch(photo_ids, output, limit=20, chunk_size=None):
+    """Stream results to output, printing throughput to stderr per chunk"""
+    
+    engine = RecommendationEngine(factors=factor_store)
+    catalog = product_db.snapshot
+    start_time = time.time()
+    stats = {'users': 0, 'missing': 0}
+    
+    def profiles():
+        for photo_id in photo_ids:
+            user_id = f"user_{photo_id}"
+            yield user_id, user_db.get_user_profile(user_id, cache=False)
+    
+    for result in engine.iter_batch(catalog, profiles(), limit, chunk_size):
+        photo_id = result['user_id'][len("user_"):]
+        output.write(json.dumps({'photo_id': photo_id, **result}) + "\n")
+        
+        stats['users'] += 1
+        if 'error' in result:
+            stats['missing'] += 1
+        
+        if stats['users'] % 10000 == 0:
+            elapsed = time.time() - start_time
+            print(f"⏳ Scored: {stats['users']:,} users ({stats['users'] / elapsed:,.0f} users/s)", file=sys.stderr)
+    
+    elapsed = time.time() - start_time
+    rate = stats['users'] / elapsed if elapsed else 0
+    print(f"\n🎉 Done in {elapsed:.1f}s!", file=sys.stderr)
+    print(f"   Scored: {stats['users']:,} users ({rate:,.0f} users/s)", file=sys.stderr)
+    print(f"   Missing profiles: {stats['missing']:,}", file=sys.stderr)
+    
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-score recommendations as NDJSON")
+    parser.add_argument("photo_ids", nargs="*", help="Photo ids to score")
+    parser.add_argument("--input", help="File of photo ids, one per line ('-' for stdin)")
+    parser.add_argument("--output", help="Output NDJSON file (default: stdout)")
+    parser.add_argument("--limit", type=int, default=20, help="Recommendations per user")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Users scored per batch")
+    args = parser.parse_args()
+    
+    if not args.photo_ids and not args.input:
+        parser.error("pass photo ids or --input")
+    
+    photo_ids = read_photo_ids(args.input) if args.input else iter(args.photo_ids)
+    if args.output:
+        with open(args.output, 'w') as output:
+            stats = recommend_batch(photo_ids, output, args.limit, args.chunk_size)
+    else:
+        stats = recommend_batch(photo_ids, sys.stdout, args.limit, args.chunk_size)
+    
+    sys.exit(1 if stats['missing'] else 0)
@@ -0,0 +1,394 @@
+"""
+Replay Benchmark - Offline latency and ranking-quality harness for RecommendationEngine
+Replays user interaction histories against a catalog through the same code
+paths the API serves (recommended-for-you and similar-products), holding out
+each user's last interaction, and reports latency percentiles, peak memory
+and hit@k / NDCG@k. Catalogs and users are generated synthetically at any
+scale, loaded from files, or taken from the live user_data/ and catalog
+"""
+
+import argparse
+import json
+import math
+import random
+import resource
+import sys
+import tempfile
+import time
+from itertools import accumulate
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+from config import settings
+from database.catalog import CatalogSnapshot
+from database.factors import FactorStore
+from database.similarity import SimilarityIndex
+from utils.factorization import implicit_als, interaction_matrix
+from utils.recommendation import RecommendationEngine
+
+CATEGORIES_BY_STYLE = {
+    'casual': ['tshirt', 'jeans', 'hoodie', 'shorts'],
+    'formal': ['shirt', 'trousers', 'blazer', 'suit'],
+    'ethnic': ['kurta', 'saree', 'sherwani', 'lehenga'],
+    'sporty': ['tracksuit', 'joggers', 'jersey', 'sneakers'],
+    'party': ['dress', 'jacket', 'gown', 'blazer'],
+}
+
+def peak_memory_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def generate_catalog(count, rng):
+    """Synthetic products shaped like products.json; colors and popularity are skewed"""
+    color_weights = [1 / (rank + 1) for rank in range(len(settings.COLOR_VOCABULARY))]
+    products = []
+
+    for i in range(count):
+        style = rng.choice(settings.STYLE_CATEGORIES)
+        category = rng.choice(CATEGORIES_BY_STYLE[style])
+        gender = rng.choice(settings.GENDER_CATEGORIES)
+        colors = list(dict.fromkeys(
+            rng.choices(settings.COLOR_VOCABULARY, color_weights, k=rng.randint(1, 3))
+        ))
+        age_start = rng.randrange(len(settings.AGE_GROUPS))
+
+        products.append({
+            'product_id': f"syn_{i:07d}",
+            'name': f"{colors[0].title()} {style.title()} {category.title()}",
+            'category': category,
+            'gender': gender,
+            'age_groups': settings.AGE_GROUPS[age_start:age_start + rng.randint(1, 3)],
+            'style': style,
+            'body_types_suited': rng.sample(settings.BODY_TYPES, rng.randint(1, 4)),
+            'colors': colors,
+            'sizes': ["S", "M", "L", "XL"],
+            'price': rng.randrange(299, 9999),
+            'image_path': f"products/{gender}/{category}_{i:07d}.png",
+            'popularity_score': min(100, int(rng.paretovariate(1.5) * 20))
+        })
+
+    return products
+
+def generate_users(count, products, rng, max_history=40, taste=0.8):
+    """
+    Synthetic users, each with a hidden taste (one or two styles and a
+    few colors). Each interaction picks a taste-matching product from the
+    user's segment with probability taste, otherwise any product there,
+    weighted by popularity so that popular products are shared between
+    users.
+    """
+    by_segment = {}
+    by_taste = {}
+    for product in products:
+        for age_group in product['age_groups']:
+            segment = (product['gender'], age_group)
+            by_segment.setdefault(segment, []).append(product)
+            for color in product['colors']:
+                by_taste.setdefault((*segment, product['style'], color), []).append(product)
+
+    # Cumulative popularity per pool, for O(log n) weighted picks
+    cumulative = {
+        key: list(accumulate(product['popularity_score'] + 1 for product in pool))
+        for pools in (by_segment, by_taste) for key, pool in pools.items()
+    }
+
+    def pick(key, pool):
+        return rng.choices(pool, cum_weights=cumulative[key])[0]
+
+    users = []
+    for i in range(count):
+        gender = rng.choice(settings.GENDER_CATEGORIES)
+        age_group = rng.choice(settings.AGE_GROUPS)
+        styles = rng.sample(settings.STYLE_CATEGORIES, rng.randint(1, 2))
+        colors = rng.sample(settings.COLOR_VOCABULARY[:8], rng.randint(1, 3))
+        pool = by_segment.get((gender, age_group))
+        if not pool:
+            continue
+
+        history = []
+        for _ in range(rng.randint(2, max_history)):
+            key = (gender, age_group, rng.choice(styles), rng.choice(colors))
+            if key in by_taste and rng.random() < taste:
+                product = pick(key, by_taste[key])
+            else:
+                product = pick((gender, age_group), pool)
+
+            history.append({
+                'action': rng.choice(['viewed', 'liked', 'tried_on']),
+                'product_id': product['product_id'],
+                'product_style': product['style'],
+                'product_colors': product['colors'],
+                'duration_seconds': rng.randint(1, 120)
+            })
+
+        users.append({
+            'user_id': f"user_syn_{i:07d}",
+            'detected_profile': {
+                'gender': gender,
+                'age_group': age_group,
+                'body_type': rng.choice(settings.BODY_TYPES)
+            },
+            'history': history
+        })
+
+    return users
+
+def load_catalog(path):
+    """Products from a products.json-style document or an NDJSON feed"""
+    with open(path) as f:
+        if path.endswith('.json'):
+            return json.load(f)['products']
+        return [json.loads(line) for line in f if line.strip()]
+
+def load_users(path):
+    """Users as NDJSON lines of {"user_id", "detected_profile", "history": [...]}"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def live_users():
+    """Profiles and interaction histories from the configured user storage"""
+    from database.users import user_db
+
+    users = []
+    for user_id in user_db.storage.user_ids():
+        profile = user_db.storage.read_profile(user_id) or {}
+        history = profile.get('interaction_history') or [
+            record for _, record in user_db.storage.iter_log(user_id, 'history')
+        ]
+        users.append({
+            'user_id': user_id,
+            'detected_profile': profile.get('detected_profile', {}),
+            'history': history
+        })
+
+    return users
+
+def save_dataset(save_dir, products, users):
+    save_dir = Path(save_dir)
+    save_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, records in (('catalog.ndjson', products), ('users.ndjson', users)):
+        with open(save_dir / name, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+def latency_summary(samples):
+    if not samples:
+        return {'count': 0}
+
+    millis = np.asarray(samples) * 1000
+    return {
+        'count': len(samples),
+        'p50_ms': round(float(np.percentile(millis, 50)), 3),
+        'p95_ms': round(float(np.percentile(millis, 95)), 3),
+        'p99_ms': round(float(np.percentile(millis, 99)), 3),
+        'mean_ms': round(float(millis.mean()), 3)
+    }
+
+def ranking_metrics(ranks, k):
+    """hit@k and NDCG@k for a single held-out item per query (rank None = missed)"""
+    if not ranks:
+        return {'queries': 0}
+
+    hits = [rank for rank in ranks if rank is not None and rank < k]
+    return {
+        'queries': len(ranks),
+        f'hit@{k}': round(len(hits) / len(ranks), 4),
+        f'ndcg@{k}': round(sum(1 / math.log2(rank + 2) for rank in hits) / len(ranks), 4)
+    }
+
+def rank_of(product_ids, target):
+    try:
+        return product_ids.index(target)
+    except ValueError:
+        return None
+
+def replayable_history(user, catalog):
+    """The user's interactions with products still in the catalog"""
+    return [
+        interaction for interaction in user['history']
+        if interaction.get('product_id') in catalog
+    ]
+
+def train_replay_factors(catalog, users, factor_dir):
+    """Fit factors on everything but each user's held-out last interaction"""
+    histories = (
+        (user['user_id'], replayable_history(user, catalog)[:-1]) for user in users
+    )
+    user_ids, item_ids, indptr, indices, values = interaction_matrix(histories)
+
+    user_factors, item_factors = implicit_als(
+        indptr, indices, values, len(item_ids),
+        factors=settings.CF_FACTORS,
+        regularization=settings.CF_REGULARIZATION,
+        alpha=settings.CF_ALPHA,
+        iterations=settings.CF_ITERATIONS
+    )
+
+    store = FactorStore(factor_dir)
+    store.save(user_ids, item_ids, user_factors, item_factors)
+    return store
+
+def replay(catalog, users, k, brute_force=False, collaborative=False):
+    """
+    Leave-last-out replay: fold every interaction but the last into the
+    profile exactly as track-interaction does, then ask for k
+    recommendations (ranked against the held-out product) and for the
+    k products most similar to the previous one. With collaborative,
+    factors are first trained on the same prefixes and blended in.
+    """
+    report = {'memory_mb': {'catalog': round(peak_memory_mb(), 1)}}
+
+    factors = None
+    if collaborative:
+        start_time = time.time()
+        factor_dir = tempfile.TemporaryDirectory()
+        factors = train_replay_factors(catalog, users, Path(factor_dir.name))
+        report['factor_training_s'] = round(time.time() - start_time, 2)
+        report['memory_mb']['factors'] = round(peak_memory_mb(), 1)
+
+    engine = RecommendationEngine(factors=factors)
+
+    index = None
+    if not brute_force:
+        start_time = time.time()
+        index_dir = tempfile.TemporaryDirectory()
+        index = SimilarityIndex(SimpleNamespace(snapshot=catalog), Path(index_dir.name), max(k, settings.SIMILARITY_TOP_K))
+        index.rebuild()
+        report['similarity_index_build_s'] = round(time.time() - start_time, 2)
+        report['memory_mb']['similarity_index'] = round(peak_memory_mb(), 1)
+
+    recommend_latency, similar_latency = [], []
+    recommend_ranks, similar_ranks = [], []
+
+    for user in users:
+        history = replayable_history(user, catalog)
+        if len(history) < 2:
+            continue
+
+        profile = {'preferences': {}}
+        for interaction in history[:-1]:
+            engine.update_user_preferences(profile, interaction)
+
+        combined_profile = {
+            **user.get('detected_profile', {}),
+            'user_id': user['user_id'],
+            'preferences': profile['preferences']
+        }
+        target = history[-1]['product_id']
+
+        start_time = time.perf_counter()
+        if brute_force:
+            recommendations = engine.get_personalized_suggestions(catalog.products, combined_profile, k)
+        else:
+            recommendations = engine.recommend(catalog, combined_profile, k)
+        recommend_latency.append(time.perf_counter() - start_time)
+        recommend_ranks.append(rank_of([p['product_id'] for p in recommendations], target))
+
+        query = catalog.get_product_by_id(history[-2]['product_id'])
+        start_time = time.perf_counter()
+        neighbors = index.neighbors(query['product_id'], k) if index else None
+        if neighbors is not None:
+            similar_ids = [product_id for product_id, _ in neighbors]
+        else:
+            similar_ids = [p['product_id'] for p in engine.get_similar_products(query, catalog.products, k)]
+        similar_latency.append(time.perf_counter() - start_time)
+        similar_ranks.append(rank_of(similar_ids, target))
+
+    report['recommended_for_you'] = {
+        'latency': latency_summary(recommend_latency),
+        **ranking_metrics(recommend_ranks, k)
+    }
+    report['similar_products'] = {
+        'latency': latency_summary(similar_latency),
+        **ranking_metrics(similar_ranks, k)
+    }
+    report['memory_mb']['peak'] = round(peak_memory_mb(), 1)
+
+    return report
+
+def print_report(report):
+    for name in ('recommended_for_you', 'similar_products'):
+        section = report[name]
+        latency = section['latency']
+        metrics = {key: value for key, value in section.items() if key not in ('latency', 'queries')}
+
+        print(f"📈 {name} ({section['queries']:,} queries)")
+        if latency['count']:
+            print(
+                f"   Latency: p50 {latency['p50_ms']:.3f}ms  "
+                f"p95 {latency['p95_ms']:.3f}ms  p99 {latency['p99_ms']:.3f}ms"
+            )
+        if metrics:
+            print("   " + "  ".join(f"{key}: {value:.4f}" for key, value in metrics.items()))
+
+    if 'factor_training_s' in report:
+        print(f"🤝 Factors trained in {report['factor_training_s']:.2f}s")
+    if 'similarity_index_build_s' in report:
+        print(f"🔗 Similarity index built in {report['similarity_index_build_s']:.2f}s")
+    print("💾 Peak memory: " + "  ".join(f"{key} {value:,.1f}MB" for key, value in report['memory_mb'].items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay interaction histories and benchmark recommendations offline")
+    parser.add_argument("--products", type=int, default=10000, help="Synthetic catalog size")
+    parser.add_argument("--users", type=int, default=1000, help="Synthetic user count")
+    parser.add_argument("--max-history", type=int, default=40, help="Longest synthetic history")
+    parser.add_argument("--catalog", help="Load products from a products.json-style file or NDJSON feed")
+    parser.add_argument("--users-file", help="Load users from NDJSON ({user_id, detected_profile, history})")
+    parser.add_argument("--live", action="store_true", help="Replay the catalog and histories the API stores")
+    parser.add_argument("--save-dir", help="Write the catalog and users used as NDJSON for later runs")
+    parser.add_argument("-k", type=int, default=10, help="Cutoff for recommendations and metrics")
+    parser.add_argument("--brute-force", action="store_true", help="Use the engine's list-based fallbacks instead of the served paths")
+    parser.add_argument("--cf", action="store_true", help="Train ALS factors on the replayed prefixes and blend them in")
+    parser.add_argument("--seed", type=int, default=42, help="Synthetic data seed")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🧪 SmartFit AI - Recommendation Replay Benchmark")
+    print("=" * 60)
+    print()
+
+    rng = random.Random(args.seed)
+    start_time = time.time()
+
+    if args.catalog:
+        products = load_catalog(args.catalog)
+    elif args.live:
+        from database.products import product_db
+        products = product_db.snapshot.products
+    else:
+        products = generate_catalog(args.products, rng)
+    catalog = CatalogSnapshot.build(products, version=1)
+
+    if args.users_file:
+        users = load_users(args.users_file)
+    elif args.live:
+        users = live_users()
+    else:
+        users = generate_users(args.users, catalog.products, rng, args.max_history)
+
+    print(f"📦 Catalog: {len(catalog):,} products  👤 Users: {len(users):,}  ({time.time() - start_time:.1f}s)")
+
+    if args.save_dir:
+        save_dataset(args.save_dir, catalog.products, users)
+        print(f"   Saved to: {args.save_dir}")
+    print()
+
+    report = replay(catalog, users, args.k, args.brute_force, args.cf)
+    report.update({
+        'products': len(catalog),
+        'users': len(users),
+        'k': args.k,
+        'brute_force': args.brute_force,
+        'collaborative': args.cf
+    })
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"\n🎉 Done in {time.time() - start_time:.1f}s!")
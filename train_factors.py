@@ -0,0 +1,68 @@
+"""
+Train Factors - Nightly collaborative-filtering job
+Fits implicit ALS on every user's interaction history and publishes the
+user and item factors as memory-mapped arrays for all API workers
+"""
+
+import argparse
+import sys
+import time
+from config import settings
+from database.factors import factor_store
+from database.users import user_db
+from utils.factorization import implicit_als, interaction_matrix
+
+def iter_histories():
+    """(user_id, interaction history) for every stored user"""
+    storage = user_db.storage
+
+    for user_id in storage.user_ids():
+        profile = storage.read_profile(user_id) or {}
+        # Profiles not yet migrated still embed their history
+        history = profile.get('interaction_history') or [
+            record for _, record in storage.iter_log(user_id, 'history')
+        ]
+        yield user_id, history
+
+def train_factors(factors, iterations, regularization, alpha):
+    start_time = time.time()
+
+    user_ids, item_ids, indptr, indices, values = interaction_matrix(iter_histories())
+    print(f"📥 Loaded {len(indices):,} user-item pairs from {len(user_ids):,} users "
+          f"over {len(item_ids):,} products ({time.time() - start_time:.1f}s)")
+
+    if not len(indices):
+        print("❌ No interactions to train on")
+        return False
+
+    train_start = time.time()
+    user_factors, item_factors = implicit_als(
+        indptr, indices, values, len(item_ids),
+        factors=factors,
+        regularization=regularization,
+        alpha=alpha,
+        iterations=iterations
+    )
+    print(f"🧮 Trained {factors} factors x {iterations} iterations ({time.time() - train_start:.1f}s)")
+
+    factor_store.save(user_ids, item_ids, user_factors, item_factors)
+    print(f"   Saved to: {settings.CF_FACTORS_DIR / factor_store.version}")
+    print(f"\n🎉 Done in {time.time() - start_time:.1f}s!")
+
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train collaborative-filtering factors from interaction history")
+    parser.add_argument("--factors", type=int, default=settings.CF_FACTORS, help="Latent dimensions")
+    parser.add_argument("--iterations", type=int, default=settings.CF_ITERATIONS, help="ALS sweeps")
+    parser.add_argument("--regularization", type=float, default=settings.CF_REGULARIZATION, help="L2 penalty")
+    parser.add_argument("--alpha", type=float, default=settings.CF_ALPHA, help="Confidence scaling")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🤝 SmartFit AI - Collaborative Filtering Factors")
+    print("=" * 60)
+    print()
+
+    trained = train_factors(args.factors, args.iterations, args.regularization, args.alpha)
+    sys.exit(0 if trained else 1)
@@ -0,0 +1,163 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# Implicit feedback strength per interaction action; unknown actions count as a view
+ACTION_WEIGHTS = {
+    'viewed': 1.0,
+    'liked': 2.0,
+    'tried_on': 3.0,
+}
+
+# Bound on the factor vectors gathered at once while solving
+SOLVE_BLOCK_CELLS = 1 << 22
+
+def interaction_matrix(
+    histories: Iterable[Tuple[str, List[Dict]]]
+) -> Tuple[List[str], List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sparse user x item matrix of summed action weights, in CSR form,
+    from (user_id, interaction history) pairs.
+    Returns (user ids, item ids, indptr, item indices, values).
+    """
+    user_ids: List[str] = []
+    item_row: Dict[str, int] = {}
+    indptr = [0]
+    indices: List[int] = []
+    values: List[float] = []
+
+    for user_id, history in histories:
+        weights: Dict[int, float] = {}
+        for interaction in history:
+            product_id = interaction.get('product_id')
+            if not product_id:
+                continue
+            item = item_row.setdefault(product_id, len(item_row))
+            weights[item] = weights.get(item, 0.0) + ACTION_WEIGHTS.get(interaction.get('action'), 1.0)
+
+        if not weights:
+            continue
+
+        user_ids.append(user_id)
+        for item in sorted(weights):
+            indices.append(item)
+            values.append(weights[item])
+        indptr.append(len(indices))
+
+    return (
+        user_ids,
+        list(item_row),
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(values, dtype=np.float64)
+    )
+
+def _transpose(indptr: np.ndarray, indices: np.ndarray, values: np.ndarray, columns: int):
+    order = np.argsort(indices, kind='stable')
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    t_indptr = np.concatenate([[0], np.cumsum(np.bincount(indices, minlength=columns))])
+    return t_indptr, rows[order], values[order]
+
+def _solve(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    confidence: np.ndarray,
+    fixed: np.ndarray,
+    regularization: float,
+    current: np.ndarray,
+    cg_steps: int
+) -> np.ndarray:
+    """
+    One ALS half-step: for every row with observations solve
+    (YtY + Yu^T (Cu - I) Yu + reg I) x = Yu^T Cu p.
+    
+    Rows are taken in order of observation count and handled in blocks
+    of zero-padded observation lists, each bounded to SOLVE_BLOCK_CELLS
+    gathered values. With cg_steps the system is approximated by that
+    many conjugate gradient steps from the current factors, which only
+    needs matrix-vector products; 0 solves it exactly.
+    """
+    rows, factors = len(indptr) - 1, fixed.shape[1]
+    solved = np.zeros((rows, factors))
+    gram = fixed.T @ fixed + regularization * np.eye(factors)
+    # Padding slots gather the trailing zero vector
+    padded = np.vstack([fixed, np.zeros(factors)])
+    counts = np.diff(indptr)
+    observed = np.flatnonzero(counts)
+    observed = observed[np.argsort(counts[observed], kind='stable')]
+    tiny = np.finfo(np.float64).tiny
+
+    start = 0
+    while start < len(observed):
+        size = max(1, SOLVE_BLOCK_CELLS // (counts[observed[start]] * factors))
+        while size > 1 and counts[observed[min(start + size, len(observed)) - 1]] * size * factors > SOLVE_BLOCK_CELLS:
+            size //= 2
+        block = observed[start:start + size]
+        start += len(block)
+
+        width = counts[block[-1]]
+        present = np.arange(width)[None, :] < counts[block][:, None]
+        positions = np.minimum(indptr[block][:, None] + np.arange(width)[None, :], len(indices) - 1)
+        vectors = padded[np.where(present, indices[positions], len(fixed))]
+        weights = np.where(present, confidence[positions], 0.0)
+        b = np.matmul(weights[:, None, :], vectors)[:, 0]
+
+        if not cg_steps:
+            a = gram + np.matmul(vectors.transpose(0, 2, 1), vectors * (weights - present)[..., None])
+            solved[block] = np.linalg.solve(a, b[..., None])[..., 0]
+            continue
+
+        def product(x):
+            projected = np.matmul(vectors, x[..., None])[..., 0] * (weights - present)
+            return x @ gram + np.matmul(projected[:, None, :], vectors)[:, 0]
+
+        x = np.array(current[block], dtype=np.float64)
+        residual = b - product(x)
+        direction = residual.copy()
+        norm = (residual * residual).sum(axis=1)
+
+        for _ in range(cg_steps):
+            step_product = product(direction)
+            step = norm / np.maximum((direction * step_product).sum(axis=1), tiny)
+            x += step[:, None] * direction
+            residual -= step[:, None] * step_product
+            new_norm = (residual * residual).sum(axis=1)
+            direction = residual + (new_norm / np.maximum(norm, tiny))[:, None] * direction
+            norm = new_norm
+
+        solved[block] = x
+
+    return solved
+
+def implicit_als(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    values: np.ndarray,
+    items: int,
+    factors: int = 32,
+    regularization: float = 0.1,
+    alpha: float = 40.0,
+    iterations: int = 15,
+    cg_steps: int = 3,
+    seed: Optional[int] = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Implicit-feedback ALS (Hu, Koren & Volinsky): every observed pair is
+    a positive with confidence 1 + alpha * value, every other pair a
+    weak negative. CPU-only NumPy; each half-step runs cg_steps
+    warm-started conjugate gradient steps per row (Takacs et al.), or
+    exact solves with cg_steps=0.
+    Returns float32 (user factors, item factors).
+    """
+    rng = np.random.default_rng(seed)
+    users = len(indptr) - 1
+    confidence = 1.0 + alpha * values
+    t_indptr, t_indices, t_confidence = _transpose(indptr, indices, confidence, items)
+
+    user_factors = np.zeros((users, factors))
+    item_factors = rng.normal(scale=0.01, size=(items, factors))
+
+    for _ in range(iterations):
+        user_factors = _solve(indptr, indices, confidence, item_factors, regularization, user_factors, cg_steps)
+        item_factors = _solve(t_indptr, t_indices, t_confidence, user_factors, regularization, item_factors, cg_steps)
+
+    return user_factors.astype(np.float32), item_factors.astype(np.float32)
@@ -0,0 +1,106 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import settings
+
+STYLE_INDEX = {style: i for i, style in enumerate(settings.STYLE_CATEGORIES)}
+COLOR_INDEX = {color: i for i, color in enumerate(settings.COLOR_VOCABULARY)}
+
+def empty_preferences() -> Dict:
+    """
+    Preference state stored in a profile: fixed-size vectors aligned to
+    settings.STYLE_CATEGORIES and settings.COLOR_VOCABULARY, decayed to
+    the updated_at epoch timestamp.
+    """
+    return {
+        'styles': [0.0] * len(STYLE_INDEX),
+        'colors': [0.0] * len(COLOR_INDEX),
+        'updated_at': None
+    }
+
+def _decay_factor(updated_at: Optional[float], now: float) -> float:
+    if updated_at is None or now <= updated_at:
+        return 1.0
+    half_life = settings.PREFERENCE_HALF_LIFE_DAYS * 86400
+    if half_life <= 0:
+        return 1.0
+    return math.exp(-math.log(2) * (now - updated_at) / half_life)
+
+def _as_vector(weights, index: Dict[str, int]) -> List[float]:
+    """Accept a vector aligned to index, or legacy {value: count} counters"""
+    if isinstance(weights, list) and len(weights) == len(index):
+        return weights
+
+    vector = [0.0] * len(index)
+    if isinstance(weights, dict):
+        for value, count in weights.items():
+            if value in index:
+                vector[index[value]] = float(count)
+    return vector
+
+def normalize_preferences(preferences: Optional[Dict]) -> Dict:
+    """Vector form of a profile's preferences, converting legacy counter dicts"""
+    if not preferences:
+        return empty_preferences()
+
+    return {
+        'styles': _as_vector(preferences.get('styles'), STYLE_INDEX),
+        'colors': _as_vector(preferences.get('colors'), COLOR_INDEX),
+        'updated_at': preferences.get('updated_at')
+    }
+
+def record_interaction(
+    preferences: Optional[Dict],
+    style: Optional[str],
+    colors: List[str],
+    now: Optional[float] = None
+) -> Dict:
+    """
+    Decay the vectors to now and add one unit of interest for the
+    interaction's style and colors. Cost is bounded by the vector size,
+    independent of how long the user's history is.
+    """
+    preferences = normalize_preferences(preferences)
+    now = time.time() if now is None else now
+
+    factor = _decay_factor(preferences.get('updated_at'), now)
+    if factor != 1.0:
+        preferences['styles'] = [w * factor for w in preferences['styles']]
+        preferences['colors'] = [w * factor for w in preferences['colors']]
+
+    if style in STYLE_INDEX:
+        preferences['styles'][STYLE_INDEX[style]] += 1.0
+
+    for color in colors:
+        if color in COLOR_INDEX:
+            preferences['colors'][COLOR_INDEX[color]] += 1.0
+
+    preferences['updated_at'] = now
+    return preferences
+
+def decayed_vectors(preferences: Optional[Dict], now: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(style weights, color weights) decayed to now, for ranking"""
+    preferences = normalize_preferences(preferences)
+    now = time.time() if now is None else now
+
+    factor = _decay_factor(preferences.get('updated_at'), now)
+    styles = np.asarray(preferences['styles'], dtype=np.float64) * factor
+    colors = np.asarray(preferences['colors'], dtype=np.float64) * factor
+
+    return styles, colors
+
+def preference_weights(preferences: Optional[Dict], now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+    """Readable {'styles': {...}, 'colors': {...}} of the non-zero decayed weights"""
+    styles, colors = decayed_vectors(preferences, now)
+
+    return {
+        'styles': {
+            style: round(float(styles[i]), 4)
+            for style, i in STYLE_INDEX.items() if styles[i] > 0
+        },
+        'colors': {
+            color: round(float(colors[i]), 4)
+            for color, i in COLOR_INDEX.items() if colors[i] > 0
+        }
+    }
@@ -1,18 +1,40 @@
-from typing import List, Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+import numpy as np
 from config import settings
+from database.columns import select_top, top_k
+from utils.preferences import COLOR_INDEX, STYLE_INDEX, decayed_vectors, record_interaction
 
 class RecommendationEngine:
-    def __init__(self):
+    def __init__(self, factors=None):
         self.style_weight = settings.STYLE_WEIGHT
         self.color_weight = settings.COLOR_WEIGHT
         self.body_type_weight = settings.BODY_TYPE_WEIGHT
+        # Optional FactorStore; blends collaborative-filtering scores into recommend()
+        self.factors = factors
+        
+        # (gender, age_group, body_type) -> (catalog version, rows, base scores)
+        self._segments: "OrderedDict[Tuple, Tuple[int, np.ndarray, np.ndarray]]" = OrderedDict()
+        self._segments_version = None
+        self._segments_lock = threading.Lock()
+        # segment key -> (its rows array, k, batch scoring features)
+        self._features: Dict[Tuple, Tuple[np.ndarray, int, Tuple]] = {}
+    
+    def profile_filters(self, user_profile: Dict) -> Dict:
+        """Hard filters for a profile, usable with ProductDatabase.query_products"""
+        return {
+            'gender': user_profile.get('gender', 'male'),
+            'age_group': user_profile.get('age_group', 'young_adults')
+        }
     
     def filter_products(self, products: List[Dict], user_profile: Dict) -> List[Dict]:
         filtered = []
         
-        user_gender = user_profile.get('gender', 'male')
-        user_age_group = user_profile.get('age_group', 'young_adults')
-        user_body_type = user_profile.get('body_type', 'average')
+        filters = self.profile_filters(user_profile)
+        user_gender = filters['gender']
+        user_age_group = filters['age_group']
         
         for product in products:
             if product.get('gender') != user_gender:
@@ -25,13 +47,18 @@ class RecommendationEngine:
         
         return filtered
     
-    def rank_products(self, products: List[Dict], user_profile: Dict) -> List[Dict]:
-        user_preferences = user_profile.get('preferences', {})
-        style_prefs = user_preferences.get('styles', {})
-        color_prefs = user_preferences.get('colors', {})
+    def rank_products(self, products: List[Dict], user_profile: Dict, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Score products into a separate array and return the top limit
+        (all when None) as scored copies, best first. The input dicts
+        are shared catalog entries and are never modified.
+        """
+        style_prefs, color_prefs = self.preference_weights(user_profile)
         user_body_type = user_profile.get('body_type', 'average')
         
-        for product in products:
+        scores = np.zeros(len(products), dtype=np.float64)
+        
+        for i, product in enumerate(products):
             score = 0
             
             product_style = product.get('style', 'casual')
@@ -47,42 +74,378 @@ class RecommendationEngine:
             if user_body_type in body_types_suited:
                 score += 10 * self.body_type_weight
             
-            product['recommendation_score'] = score
+            scores[i] = score
         
-        sorted_products = sorted(
-            products, 
-            key=lambda x: x.get('recommendation_score', 0), 
-            reverse=True
-        )
+        rows = np.arange(len(products))
+        top_rows = top_k(scores, rows, len(products) if limit is None else limit)
         
-        return sorted_products
+        return [
+            {**products[row], 'recommendation_score': float(scores[row])}
+            for row in top_rows
+        ]
     
     def get_personalized_suggestions(self, all_products: List[Dict], user_profile: Dict, limit: int = None) -> List[Dict]:
         filtered = self.filter_products(all_products, user_profile)
         
-        ranked = self.rank_products(filtered, user_profile)
+        return self.rank_products(filtered, user_profile, limit or settings.TOP_SUGGESTIONS_COUNT)
+    
+    def preference_weights(self, user_profile: Dict) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """Non-zero time-decayed style and color weights of a profile"""
+        styles, colors = decayed_vectors(user_profile.get('preferences'))
+        
+        style_prefs = {style: styles[i] for style, i in STYLE_INDEX.items() if styles[i]}
+        color_prefs = {color: colors[i] for color, i in COLOR_INDEX.items() if colors[i]}
+        
+        return style_prefs, color_prefs
+    
+    def _segment(self, catalog, gender: str, age_group: str, body_type: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Candidate rows of a (gender, age_group, body_type) segment,
+        ordered by their preference-free score (the body type bonus)
+        with ties in catalog order, plus those scores. Cached per
+        catalog version in a bounded LRU.
+        """
+        key = (gender, age_group, body_type)
+        
+        with self._segments_lock:
+            entry = self._segments.get(key)
+            if entry is not None and entry[0] == catalog.version:
+                self._segments.move_to_end(key)
+                return entry[1], entry[2]
+        
+        columns = catalog.columns
+        mask = columns.equals(columns.gender_codes, columns.gender_vocabulary, gender)
+        mask &= columns.contains(columns.age_masks, columns.age_vocabulary, age_group)
+        rows = np.flatnonzero(mask)
+        
+        base = 10 * self.body_type_weight * columns.contains(
+            columns.body_type_masks[rows], columns.body_type_vocabulary, body_type
+        )
+        order = np.lexsort((rows, -base))
+        rows, base = rows[order], base[order]
+        
+        with self._segments_lock:
+            if self._segments_version is None or catalog.version > self._segments_version:
+                # Catalog changed: every cached segment is stale
+                self._segments.clear()
+                self._features.clear()
+                self._segments_version = catalog.version
+            
+            if catalog.version == self._segments_version:
+                self._segments[key] = (catalog.version, rows, base)
+                self._segments.move_to_end(key)
+                while len(self._segments) > settings.RECOMMENDATION_CACHE_SEGMENTS:
+                    evicted, _ = self._segments.popitem(last=False)
+                    self._features.pop(evicted, None)
+        
+        return rows, base
+    
+    def _preference_scores(self, columns, rows: np.ndarray, style_prefs: Dict, color_prefs: Dict) -> np.ndarray:
+        style_table = columns.code_weights(columns.style_vocabulary, {
+            style: weight * self.style_weight for style, weight in style_prefs.items()
+        })
+        scores = style_table[columns.style_codes[rows]]
+        
+        color_masks = columns.color_masks[rows]
+        for color, weight in color_prefs.items():
+            scores += weight * self.color_weight * columns.contains(
+                color_masks, columns.color_vocabulary, color
+            )
+        
+        return scores
+    
+    def recommend(self, catalog, user_profile: Dict, limit: int = None) -> List[Dict]:
+        """
+        Top suggestions from a catalog snapshot. Same results as
+        get_personalized_suggestions, without walking products in Python.
+        
+        The profile's segment comes from the cache. Without preferences
+        the answer is its head as is; with preferences only the first
+        RECOMMENDATION_CACHE_HEAD candidates are reranked, unless a
+        candidate beyond them could still score into the top k.
+        
+        When a FactorStore holds factors for the profile's user_id, this
+        becomes a retrieval stage: the CF_CANDIDATES best rule matches
+        and the CF_CANDIDATES best factor dot products are pooled and
+        ranked by rule score + CF_BLEND_WEIGHT * dot product.
+        """
+        columns = catalog.columns
+        filters = self.profile_filters(user_profile)
+        body_type = user_profile.get('body_type', 'average')
+        k = limit or settings.TOP_SUGGESTIONS_COUNT
+        
+        rows, base = self._segment(catalog, filters['gender'], filters['age_group'], body_type)
+        style_prefs, color_prefs = self.preference_weights(user_profile)
+        
+        user_vector = None
+        if self.factors is not None and len(rows):
+            user_vector = self.factors.user_vector(user_profile.get('user_id'))
+        
+        if user_vector is None:
+            top, scores = self._rule_top(columns, rows, base, style_prefs, color_prefs, k)
+        else:
+            top, scores = self._blended_top(catalog, rows, base, style_prefs, color_prefs, user_vector, k)
+        
+        return [
+            {**columns.products[rows[i]], 'recommendation_score': float(scores[i])}
+            for i in top
+        ]
+    
+    def _rule_top(
+        self,
+        columns,
+        rows: np.ndarray,
+        base: np.ndarray,
+        style_prefs: Dict,
+        color_prefs: Dict,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions of the top k segment rows by rule score, best first, and scores indexable by them"""
+        if not style_prefs and not color_prefs:
+            return np.arange(min(k, len(rows))), base
+        
+        head = min(len(rows), max(settings.RECOMMENDATION_CACHE_HEAD, k))
+        scores = self._preference_scores(columns, rows[:head], style_prefs, color_prefs) + base[:head]
+        top = select_top(scores, rows[:head], k)
+        
+        if head < len(rows):
+            # Best score a candidate outside the head could still reach
+            max_outside = base[head] + (
+                max(style_prefs.values(), default=0) * self.style_weight
+                + sum(color_prefs.values()) * self.color_weight
+            )
+            if scores[top[-1]] <= max_outside:
+                scores = self._preference_scores(columns, rows, style_prefs, color_prefs) + base
+                top = select_top(scores, rows, k)
+        
+        return top, scores
+    
+    def _blended_top(
+        self,
+        catalog,
+        rows: np.ndarray,
+        base: np.ndarray,
+        style_prefs: Dict,
+        color_prefs: Dict,
+        user_vector: np.ndarray,
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Retrieve rule and factor candidates, then rank them by the blended score"""
+        columns = catalog.columns
+        candidates = max(k, settings.CF_CANDIDATES)
+        
+        rule_top, _ = self._rule_top(columns, rows, base, style_prefs, color_prefs, candidates)
+        affinity = self.factors.item_scores(catalog, user_vector)[rows].astype(np.float64)
+        pool = np.union1d(rule_top, select_top(affinity, rows, candidates))
+        
+        scores = np.zeros(len(rows))
+        scores[pool] = (
+            self._preference_scores(columns, rows[pool], style_prefs, color_prefs)
+            + base[pool]
+            + settings.CF_BLEND_WEIGHT * affinity[pool]
+        )
+        return pool[select_top(scores[pool], rows[pool], k)], scores
+    
+    def _batch_features(self, catalog, key: Tuple, rows: np.ndarray, base: np.ndarray, k: int) -> Tuple:
+        """
+        The part of a segment a batch top k can come from, with its rows
+        as (rows, styles) one-hot and (rows, colors) indicator matrices
+        in preference-vector order, and for each position the most
+        vocabulary colors any row from there on has.
+        
+        Rows sharing style, colors and base score always score alike, so
+        only the first k of each such group (in segment order, i.e. the
+        tie order) can make a top k; the rest are dropped. Cached per
+        segment and k.
+        """
+        with self._segments_lock:
+            cached = self._features.get(key)
+            if cached is not None and cached[0] is rows and cached[1] == k:
+                return cached[2]
+        
+        columns = catalog.columns
+        style_of_code = np.full(len(columns.style_vocabulary) + 1, -1, dtype=np.int64)
+        for style, code in columns.style_vocabulary.items():
+            style_of_code[code] = STYLE_INDEX.get(style, -1)
+        style_index = style_of_code[columns.style_codes[rows]]
+        
+        color_masks = columns.color_masks[rows]
+        color_bits = np.zeros(len(rows), dtype=np.int64)
+        for color, i in COLOR_INDEX.items():
+            color_bits |= columns.contains(color_masks, columns.color_vocabulary, color).astype(np.int64) << i
+        
+        _, tier = np.unique(base, return_inverse=True)
+        group = (tier.reshape(-1) * (len(STYLE_INDEX) + 1) + style_index + 1) << len(COLOR_INDEX) | color_bits
+        order = np.argsort(group, kind='stable')
+        starts = np.flatnonzero(np.r_[True, group[order][1:] != group[order][:-1]])
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        keep = np.flatnonzero(rank < k)
+        
+        style_index, color_bits = style_index[keep], color_bits[keep]
+        known = np.flatnonzero(style_index >= 0)
+        styles = np.zeros((len(keep), len(STYLE_INDEX)))
+        styles[known, style_index[known]] = 1
+        colors = ((color_bits[:, None] >> np.arange(len(COLOR_INDEX))) & 1).astype(np.float64)
+        tail_colors = np.maximum.accumulate(colors.sum(axis=1)[::-1])[::-1].astype(np.int64)
+        
+        features = (rows[keep], base[keep], styles, colors, tail_colors)
+        with self._segments_lock:
+            if key in self._segments and self._segments[key][1] is rows:
+                self._features[key] = (rows, k, features)
+        
+        return features
+    
+    def recommend_batch(self, catalog, user_profiles: List[Dict], limit: int = None) -> List[List[Tuple[Dict, float]]]:
+        """
+        recommend() for many profiles at once, returning (product, score)
+        lists in input order. Profiles are grouped by segment and each
+        group is scored with two matrix products over the cached head;
+        only users whose top k could still change beyond the head are
+        rescored against the whole segment, in chunks of at most
+        BATCH_SCORE_CELLS scores. Scores match recommend() up to
+        floating-point summation order. Users with collaborative-filtering
+        factors need per-user retrieval and go through recommend().
+        """
+        columns = catalog.columns
+        k = limit or settings.TOP_SUGGESTIONS_COUNT
+        now = time.time()
+        results: List[List[Tuple[Dict, float]]] = [[] for _ in user_profiles]
+        
+        segments: Dict[Tuple, List[int]] = {}
+        for i, user_profile in enumerate(user_profiles):
+            if self.factors is not None and self.factors.user_vector(user_profile.get('user_id')) is not None:
+                # Blended ranking retrieves candidates per user
+                results[i] = [
+                    (product, product['recommendation_score'])
+                    for product in self.recommend(catalog, user_profile, k)
+                ]
+                continue
+            
+            filters = self.profile_filters(user_profile)
+            key = (filters['gender'], filters['age_group'], user_profile.get('body_type', 'average'))
+            segments.setdefault(key, []).append(i)
+        
+        def emit(members, scores, rows):
+            for member, user_scores in zip(members, scores):
+                top = select_top(user_scores, rows, k)
+                results[member] = [
+                    (columns.products[row], float(score))
+                    for row, score in zip(rows[top], user_scores[top])
+                ]
         
-        if limit:
-            return ranked[:limit]
+        for key, members in segments.items():
+            rows, base = self._segment(catalog, *key)
+            if not len(rows):
+                continue
+            
+            style_weights = np.zeros((len(members), len(STYLE_INDEX)))
+            color_weights = np.zeros((len(members), len(COLOR_INDEX)))
+            for j, i in enumerate(members):
+                style_weights[j], color_weights[j] = decayed_vectors(
+                    user_profiles[i].get('preferences'), now
+                )
+            style_weights *= self.style_weight
+            color_weights *= self.color_weight
+            
+            members = np.asarray(members)
+            has_preferences = style_weights.any(axis=1) | color_weights.any(axis=1)
+            for member in members[~has_preferences]:
+                results[member] = [
+                    (columns.products[row], float(score))
+                    for row, score in zip(rows[:k], base[:k])
+                ]
+            
+            if not has_preferences.any():
+                continue
+            
+            members = members[has_preferences]
+            style_weights = style_weights[has_preferences]
+            color_weights = color_weights[has_preferences]
+            rows, base, styles, colors, tail_colors = self._batch_features(catalog, key, rows, base, k)
+            head = min(len(rows), max(settings.RECOMMENDATION_CACHE_HEAD, k))
+            
+            scores = style_weights @ styles[:head].T + color_weights @ colors[:head].T + base[:head]
+            
+            rescore = np.zeros(len(members), dtype=bool)
+            if head < len(rows):
+                # Best score a candidate outside the head could still reach
+                best_colors = np.sort(np.maximum(color_weights, 0), axis=1)[:, ::-1]
+                max_outside = (
+                    base[head]
+                    + np.maximum(style_weights.max(axis=1), 0)
+                    + best_colors[:, :tail_colors[head]].sum(axis=1)
+                )
+                kth = np.partition(scores, head - k, axis=1)[:, head - k]
+                rescore = kth <= max_outside
+            
+            emit(members[~rescore], scores[~rescore], rows[:head])
+            
+            rescore = np.flatnonzero(rescore)
+            chunk = max(1, settings.BATCH_SCORE_CELLS // len(rows))
+            for start in range(0, len(rescore), chunk):
+                batch = rescore[start:start + chunk]
+                full_scores = style_weights[batch] @ styles.T + color_weights[batch] @ colors.T + base
+                emit(members[batch], full_scores, rows)
+        
+        return results
+    
+    def iter_batch(
+        self,
+        catalog,
+        user_profiles: Iterable[Tuple[str, Optional[Dict]]],
+        limit: int = None,
+        chunk_size: int = None
+    ) -> Iterator[Dict]:
+        """
+        Stream recommend_batch() over (user_id, profile) pairs, one result
+        dict per user in input order; a missing profile yields an error
+        entry. Profiles are consumed chunk_size at a time so memory stays
+        bounded for arbitrarily long inputs.
+        """
+        chunk_size = chunk_size or settings.BATCH_USERS_PER_CHUNK
+        chunk: List[Tuple[str, Optional[Dict]]] = []
         
-        return ranked[:settings.TOP_SUGGESTIONS_COUNT]
+        def rank_chunk(chunk):
+            found = [
+                {
+                    **user_profile.get('detected_profile', {}),
+                    'user_id': user_id,
+                    'preferences': user_profile.get('preferences', {})
+                }
+                for user_id, user_profile in chunk if user_profile
+            ]
+            ranked = iter(self.recommend_batch(catalog, found, limit))
+            
+            for user_id, user_profile in chunk:
+                if not user_profile:
+                    yield {'user_id': user_id, 'error': 'User profile not found'}
+                    continue
+                
+                yield {
+                    'user_id': user_id,
+                    'recommendations': [
+                        {'product_id': product['product_id'], 'recommendation_score': score}
+                        for product, score in next(ranked)
+                    ]
+                }
+        
+        for entry in user_profiles:
+            chunk.append(entry)
+            if len(chunk) >= chunk_size:
+                yield from rank_chunk(chunk)
+                chunk = []
+        
+        if chunk:
+            yield from rank_chunk(chunk)
     
     def update_user_preferences(self, user_profile: Dict, interaction: Dict) -> Dict:
-        if 'preferences' not in user_profile:
-            user_profile['preferences'] = {
-                'styles': {},
-                'colors': {}
-            }
-        
-        product_style = interaction.get('product_style')
-        if product_style:
-            current = user_profile['preferences']['styles'].get(product_style, 0)
-            user_profile['preferences']['styles'][product_style] = current + 1
-        
-        product_colors = interaction.get('product_colors', [])
-        for color in product_colors:
-            current = user_profile['preferences']['colors'].get(color, 0)
-            user_profile['preferences']['colors'][color] = current + 1
+        """Fold an interaction into the profile's decayed preference vectors"""
+        user_profile['preferences'] = record_interaction(
+            user_profile.get('preferences'),
+            interaction.get('product_style'),
+            interaction.get('product_colors', [])
+        )
         
         return user_profile
     
@@ -0,0 +1,45 @@
+import hashlib
+from pathlib import Path
+from typing import Iterator, Optional
+from config import settings
+
+def shard_prefix(key: str, depth: Optional[int] = None) -> str:
+    """Two-level (by default) hex prefix like 'a3/f0' spreading keys evenly"""
+    depth = settings.STORAGE_SHARD_DEPTH if depth is None else depth
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return '/'.join(digest[2 * i:2 * i + 2] for i in range(depth))
+
+def key_of(filename: str) -> str:
+    """Shard key of a stored file: its name up to the first dot"""
+    return filename.split('.', 1)[0]
+
+def sharded_path(base_dir: Path, filename: str, create: bool = False) -> Path:
+    """Location of filename under base_dir; create makes the shard directory"""
+    prefix = shard_prefix(key_of(filename))
+    directory = base_dir / prefix if prefix else base_dir
+
+    if create:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    return directory / filename
+
+def sharded_url(mount: str, filename: str) -> str:
+    """Public URL of a file served by the StaticFiles mount at /mount"""
+    prefix = shard_prefix(key_of(filename))
+    return f"/{mount}/{prefix}/{filename}" if prefix else f"/{mount}/{filename}"
+
+def find_sharded(base_dir: Path, key: str) -> Optional[Path]:
+    """First file stored under key (any extension), scanning only its shard"""
+    directory = sharded_path(base_dir, key).parent
+    if not directory.is_dir():
+        return None
+
+    for path in directory.glob(f"{key}.*"):
+        return path
+
+    return None
+
+def iter_sharded(base_dir: Path, pattern: str = "*") -> Iterator[Path]:
+    """Files matching pattern across every shard directory"""
+    depth = settings.STORAGE_SHARD_DEPTH
+    return base_dir.glob('/'.join(['*'] * depth + [pattern]))